@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the download engine (``python -m benchmarks``)
+"""
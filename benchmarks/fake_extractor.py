@@ -0,0 +1,68 @@
+"""
+Stand-in for the yt-dlp YouTube extractor that never touches the network
+
+``FakeMetadataStore`` answers ``extract`` with a synthetic info dict whose
+formats point at a local ``MediaServer``. Everything after extraction
+(format selection, the download itself, post-processing, the archive and
+the journal) runs the real code.
+"""
+
+import threading
+import time
+
+from downloader.extraction import MetadataStore
+
+FAKE_URL_PREFIX = 'fake://video/'
+
+
+def fake_url(index):
+    """Get the page URL of the ``index``-th synthetic video"""
+    return f'{FAKE_URL_PREFIX}{index:06d}'
+
+
+def make_info(url, server):
+    """Build an unprocessed info dict like the YouTube extractor returns"""
+    video_id = url[len(FAKE_URL_PREFIX):]
+    size = server.size
+    return {
+        '_type': 'video',
+        'id': video_id,
+        'title': f'Benchmark video {video_id}',
+        'duration': 60,
+        'webpage_url': url,
+        'extractor': 'generic',
+        'extractor_key': 'Generic',
+        'formats': [
+            {'format_id': '140', 'url': server.url(f'{video_id}-140.m4a'), 'ext': 'm4a',
+             'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 129, 'filesize': size},
+            {'format_id': '251', 'url': server.url(f'{video_id}-251.webm'), 'ext': 'webm',
+             'acodec': 'opus', 'vcodec': 'none', 'abr': 135, 'filesize': size},
+            {'format_id': '18', 'url': server.url(f'{video_id}-18.mp4'), 'ext': 'mp4',
+             'acodec': 'mp4a.40.2', 'vcodec': 'avc1.42001E', 'height': 360, 'width': 640,
+             'filesize': size},
+            {'format_id': '22', 'url': server.url(f'{video_id}-22.mp4'), 'ext': 'mp4',
+             'acodec': 'mp4a.40.2', 'vcodec': 'avc1.64001F', 'height': 720, 'width': 1280,
+             'filesize': size},
+        ],
+    }
+
+
+class FakeMetadataStore(MetadataStore):
+    """``MetadataStore`` that makes up info dicts instead of running yt-dlp
+
+    ``latency`` simulates the time a real extraction takes. ``extractions``
+    counts how often extraction actually ran.
+    """
+    def __init__(self, server, latency=0.0):
+        super().__init__()
+        self.server = server
+        self.latency = latency
+        self.extractions = 0
+        self._count_lock = threading.Lock()
+
+    def extract(self, url):
+        with self._count_lock:
+            self.extractions += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return make_info(url, self.server)
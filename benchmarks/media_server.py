@@ -0,0 +1,183 @@
+"""
+Local HTTP server that stands in for the YouTube media CDN
+
+Every path under ``/media/`` serves the same synthetic payload of
+``size`` bytes, so no files are needed on disk. Each request waits
+``latency`` seconds before answering and each connection is throttled to
+``bandwidth`` bytes per second (0 for unlimited). Range requests are
+supported so the range downloader and resumed downloads work too.
+
+To exercise retries and adaptive concurrency the server can answer with
+HTTP 429: a ``throttle_rate`` fraction of requests at random, and every
+request that arrives while more than ``throttle_above`` are in flight.
+"""
+
+import http.server
+import random
+import re
+import threading
+import time
+
+BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class MediaServer:
+    """Serve synthetic media files on a local port from a background thread
+
+    Use as a context manager, or call ``start`` and ``stop``.
+    """
+    def __init__(self, size=1024 * 1024, latency=0.0, bandwidth=0, host='127.0.0.1', port=0,
+                 throttle_rate=0.0, throttle_above=0):
+        self.size = size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self.throttle_above = throttle_above
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self._block = random.Random(0).randbytes(BLOCK_SIZE)
+        self._random = random.Random(1)
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, name):
+        """Get the URL of a media file"""
+        return f'{self.base_url}/media/{name}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='media-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def read(self, start, length):
+        """Get ``length`` bytes of the payload starting at ``start``"""
+        chunks = []
+        while length > 0:
+            offset = start % BLOCK_SIZE
+            chunk = self._block[offset:offset + length]
+            chunks.append(chunk)
+            start += len(chunk)
+            length -= len(chunk)
+        return b''.join(chunks)
+
+    def count(self, sent):
+        with self._lock:
+            self.bytes_sent += sent
+
+    def begin_request(self):
+        """Count a new media request; returns False if it should be throttled"""
+        with self._lock:
+            self.requests += 1
+            throttled = ((self.throttle_above and self.in_flight >= self.throttle_above)
+                         or (self.throttle_rate and self._random.random() < self.throttle_rate))
+            if throttled:
+                self.throttled += 1
+            else:
+                self.in_flight += 1
+            return not throttled
+
+    def end_request(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+def _make_handler(server):
+    class MediaRequestHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_HEAD(self):
+            self.respond(send_body=False)
+
+        def do_GET(self):
+            self.respond(send_body=True)
+
+        def respond(self, send_body):
+            if not self.path.startswith('/media/'):
+                with server._lock:
+                    server.requests += 1
+                self.send_error(404)
+                return
+            if not server.begin_request():
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            try:
+                self.send_media(send_body)
+            finally:
+                server.end_request()
+
+        def send_media(self, send_body):
+            if server.latency:
+                time.sleep(server.latency)
+
+            size = server.size
+            start, end = 0, size - 1
+            match = RANGE_RE.match(self.headers.get('Range', ''))
+            if match:
+                start = int(match[1])
+                end = min(int(match[2]), size - 1) if match[2] else size - 1
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                self.send_response(200)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            if send_body:
+                self.send_body(start, end + 1)
+
+        def send_body(self, start, end):
+            began = time.monotonic()
+            sent = 0
+            position = start
+            while position < end:
+                length = min(BLOCK_SIZE, end - position)
+                try:
+                    self.wfile.write(server.read(position, length))
+                except OSError:
+                    break
+                position += length
+                sent += length
+                server.count(length)
+                if server.bandwidth:
+                    # Sleep until this connection is back under its rate
+                    delay = sent / server.bandwidth - (time.monotonic() - began)
+                    if delay > 0:
+                        time.sleep(delay)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MediaRequestHandler
@@ -0,0 +1,340 @@
+"""
+Offline benchmarks for the download path
+
+    python -m benchmarks                          # batch sizes 1, 10, 100, 1000
+    python -m benchmarks --batch-sizes 50 --size 4M --bandwidth 2M --latency 0.05
+    python -m benchmarks --ui --batch-sizes 200   # UI event-loop latency
+    python -m benchmarks --batch-sizes 20 -j 6 --throttle-above 2   # 429s from the server
+    python -m benchmarks --startup                # app start-up time
+
+Each run starts a local ``MediaServer`` and drives the real
+``DownloadEngine`` with a ``FakeMetadataStore`` in place of the YouTube
+extractor, so results only depend on this machine. Downloads go to a
+temporary folder that is deleted afterwards.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from yt_dlp.utils import parse_bytes
+
+from benchmarks.fake_extractor import FakeMetadataStore, fake_url
+from benchmarks.media_server import MediaServer
+from benchmarks.startup import print_startup_report, run_startup_benchmark
+from downloader.engine import DownloadEngine
+from downloader.events import EventQueue
+from downloader.metrics import MetricsCollector
+from downloader.options import AUDIO_FORMATS, DownloadOptions
+from downloader.profiling import Profiler
+from downloader.progress import PostProcessHistory, format_bytes
+from downloader.ratelimit import TokenBucket
+from downloader.scheduler import JobState
+
+
+def create_engine(server, folder, args, listener=None, metrics=None, profiler=None):
+    options = DownloadOptions(download_folder=folder, video_quality=args.quality,
+                              audio_format=args.audio_format, max_workers=args.jobs, quiet=True,
+                              use_archive=False, use_journal=False,
+                              range_connections=args.connections,
+                              adaptive_concurrency=args.adaptive, max_workers_limit=args.max_jobs,
+                              max_retries=args.retries, session_max_uses=args.session_uses)
+    metadata = FakeMetadataStore(server, latency=args.extract_latency)
+    # Keep benchmark timings out of the app's post-processing history
+    history = PostProcessHistory(os.path.join(folder, 'postprocess_history.json'))
+    return DownloadEngine(options, listener=listener, metadata=metadata, limiter=TokenBucket(),
+                          metrics=metrics, profiler=profiler, history=history)
+
+
+def create_jobs(engine, count, args):
+    urls = [fake_url(i) for i in range(1, count + 1)]
+    return engine.build_jobs(urls, video='video' in args.types, audio='audio' in args.types)
+
+
+def create_server(args):
+    return MediaServer(args.size, args.latency, args.bandwidth, throttle_rate=args.throttle_rate,
+                       throttle_above=args.throttle_above)
+
+
+def run_batch_benchmark(count, args, profiler=None):
+    """Download ``count`` synthetic videos and measure throughput, phases and memory"""
+    folder = tempfile.mkdtemp(prefix='ytdl-bench-')
+    try:
+        with create_server(args) as server:
+            metrics = MetricsCollector()
+            engine = create_engine(server, folder, args, metrics=metrics, profiler=profiler)
+            jobs = create_jobs(engine, count, args)
+
+            if args.trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            result = engine.run_batch(jobs)
+            elapsed = time.perf_counter() - started
+            peak_memory = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+            if args.trace_memory:
+                tracemalloc.stop()
+
+            files = result.success_count
+            return {
+                'batch_size': count,
+                'jobs': len(jobs),
+                'files': files,
+                'failed': len(result.failed_jobs),
+                'seconds': elapsed,
+                'files_per_second': files / elapsed,
+                'bytes_per_second': server.bytes_sent / elapsed,
+                'bytes': server.bytes_sent,
+                'requests': server.requests,
+                'throttled': server.throttled,
+                'retries': dict(metrics.retries),
+                'final_workers': engine.scheduler.max_workers,
+                'sessions_created': engine.sessions.created,
+                'sessions_reused': engine.sessions.reused,
+                'extractions': engine.metadata.extractions,
+                'peak_memory_bytes': peak_memory,
+                'errors': sorted({str(job.error) for job in result.failed_jobs}),
+                # Mean seconds per job spent in each state
+                'phases': metrics.phase_means(),
+            }
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_ui_benchmark(count, args):
+    """Run a batch while a UI-style loop drains events and measure how late its ticks are
+
+    Uses a real Tk main loop and text widget when a display is available,
+    otherwise a plain loop with the same tick and drain logic.
+    """
+    from youtube_video_downloader import MAX_LOG_LINES, UI_TICK_MS
+
+    events = EventQueue()
+    folder = tempfile.mkdtemp(prefix='ytdl-bench-')
+    try:
+        with create_server(args) as server:
+            engine = create_engine(server, folder, args, events.post)
+            jobs = create_jobs(engine, count, args)
+            batch = threading.Thread(target=engine.run_batch, args=(jobs,), name='benchmark-batch')
+
+            started = time.perf_counter()
+            batch.start()
+            lateness, drained, backend = run_ui_loop(events, batch, UI_TICK_MS / 1000, MAX_LOG_LINES)
+            elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    lateness_ms = sorted(value * 1000 for value in lateness) or [0.0]
+    return {
+        'batch_size': count,
+        'jobs': len(jobs),
+        'backend': backend,
+        'seconds': elapsed,
+        'ticks': len(lateness),
+        'tick_ms': UI_TICK_MS,
+        'late_p50_ms': percentile(lateness_ms, 50),
+        'late_p95_ms': percentile(lateness_ms, 95),
+        'late_p99_ms': percentile(lateness_ms, 99),
+        'late_max_ms': lateness_ms[-1],
+        'max_events_per_tick': max(drained, default=0),
+    }
+
+
+def run_ui_loop(events, batch, interval, max_lines):
+    """Drain ``events`` every ``interval`` seconds until ``batch`` exits
+
+    Returns the lateness of every tick, the events drained per tick and the
+    name of the loop that was used.
+    """
+    lateness = []
+    drained = []
+
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception:
+        root = None
+
+    if root is None:
+        log = deque(maxlen=max_lines)
+        deadline = time.perf_counter() + interval
+        while batch.is_alive() or len(events):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lateness.append(max(0.0, time.perf_counter() - deadline))
+            batch_events = events.drain()
+            drained.append(len(batch_events))
+            log.extend(str(event.get('message', event['type'])) for event in batch_events)
+            deadline = time.perf_counter() + interval
+        return lateness, drained, 'plain'
+
+    root.withdraw()
+    text = tkinter.Text(root)
+    text.pack()
+    deadline = [time.perf_counter() + interval]
+
+    def tick():
+        lateness.append(max(0.0, time.perf_counter() - deadline[0]))
+        batch_events = events.drain()
+        drained.append(len(batch_events))
+        lines = [str(event.get('message', event['type'])) for event in batch_events]
+        if lines:
+            text.insert('end', '\n'.join(lines) + '\n')
+            line_count = int(text.index('end-1c').split('.')[0])
+            if line_count > max_lines:
+                text.delete('1.0', f'{line_count - max_lines}.0')
+            text.see('end')
+        if not batch.is_alive() and not len(events):
+            root.quit()
+            return
+        deadline[0] = time.perf_counter() + interval
+        root.after(int(interval * 1000), tick)
+
+    root.after(int(interval * 1000), tick)
+    root.mainloop()
+    root.destroy()
+    return lateness, drained, 'tk'
+
+
+def percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def print_batch_report(report):
+    print(f"\n📦 Batch of {report['batch_size']} URL(s), {report['jobs']} job(s)")
+    print(f"   {report['files']} file(s), {report['failed']} failed in {report['seconds']:.2f}s")
+    print(f"   {report['files_per_second']:.1f} files/s, {format_bytes(report['bytes_per_second'])}/s "
+          f"({format_bytes(report['bytes'])} in {report['requests']} request(s))")
+    if report['throttled'] or report['retries']:
+        retries = ', '.join(f"{count} {kind}" for kind, count in sorted(report['retries'].items()))
+        print(f"   {report['throttled']} request(s) throttled, retries: {retries or 'none'}, "
+              f"ending with {report['final_workers']} parallel download(s)")
+    print(f"   {report['sessions_created']} YoutubeDL session(s) built, "
+          f"{report['sessions_reused']} reuse(s)")
+    for error in report['errors']:
+        print(f"   ❌ {error}")
+    if report['peak_memory_bytes'] is not None:
+        print(f"   Peak Python memory: {format_bytes(report['peak_memory_bytes'])}")
+    order = [JobState.QUEUED, JobState.EXTRACTING, JobState.DOWNLOADING, JobState.POSTPROCESSING]
+    phases = report['phases']
+    for state in order + sorted(set(phases) - set(order)):
+        if state in phases:
+            print(f"   {state:>15}: {phases[state] * 1000:9.1f} ms/job")
+
+
+def print_ui_report(report):
+    print(f"\n🖥️ UI loop ({report['backend']}) during a batch of {report['batch_size']} URL(s), "
+          f"{report['ticks']} tick(s) of {report['tick_ms']} ms in {report['seconds']:.2f}s")
+    print(f"   Tick lateness p50 {report['late_p50_ms']:.1f} ms, p95 {report['late_p95_ms']:.1f} ms, "
+          f"p99 {report['late_p99_ms']:.1f} ms, max {report['late_max_ms']:.1f} ms")
+    print(f"   Up to {report['max_events_per_tick']} event(s) drained per tick")
+
+
+def parse_size(value):
+    size = parse_bytes(value)
+    if size is None:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r}")
+    return size
+
+
+def parse_batch_sizes(value):
+    try:
+        sizes = [int(size) for size in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid batch sizes {value!r}")
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("batch sizes must be at least 1")
+    return sizes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Benchmark the download path against a local media server")
+    parser.add_argument('--batch-sizes', type=parse_batch_sizes, default=[1, 10, 100, 1000],
+                        help="Comma separated URL counts to run (default: 1,10,100,1000)")
+    parser.add_argument('--size', type=parse_size, default=parse_bytes('256K'),
+                        help="Size of every media file, e.g. 256K or 8M (default: 256K)")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds before the server answers each request (default: 0)")
+    parser.add_argument('--bandwidth', type=parse_size, default=0,
+                        help="Per-connection bandwidth in bytes/s, e.g. 2M (default: unlimited)")
+    parser.add_argument('--extract-latency', type=float, default=0.0,
+                        help="Seconds each fake extraction takes (default: 0)")
+    parser.add_argument('--types', choices=['video', 'audio', 'both'], default='video',
+                        help="Download types per URL (default: %(default)s)")
+    parser.add_argument('--quality', default='720p', help="Video quality (default: %(default)s)")
+    parser.add_argument('--audio-format', default='M4A', type=str.upper, choices=AUDIO_FORMATS,
+                        help="Audio format; all but M4A need ffmpeg, which also extracts the audio "
+                             "from the video with --types both when installed (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=3,
+                        help="Number of parallel downloads (default: %(default)s)")
+    parser.add_argument('--connections', type=int, default=0,
+                        help="Range downloader connections per file (default: off)")
+    parser.add_argument('--max-jobs', type=int, default=8,
+                        help="Most parallel downloads adaptive concurrency may use (default: %(default)s)")
+    parser.add_argument('--no-adaptive', dest='adaptive', action='store_false',
+                        help="Keep -j parallel downloads even when the server throttles")
+    parser.add_argument('--retries', type=int, default=3,
+                        help="Retries per job after throttling or network errors (default: %(default)s)")
+    parser.add_argument('--session-uses', type=int, default=50,
+                        help="Jobs per pooled YoutubeDL session; 1 builds one per job (default: %(default)s)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help="Fraction of media requests the server answers with HTTP 429 (default: 0)")
+    parser.add_argument('--throttle-above', type=int, default=0,
+                        help="Answer HTTP 429 while more than this many requests are in flight "
+                             "(default: never)")
+    parser.add_argument('--no-trace-memory', dest='trace_memory', action='store_false',
+                        help="Skip tracemalloc, which slows the run down but reports peak memory")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Profile the batch runs with cProfile and write the stats here")
+    parser.add_argument('--ui', action='store_true',
+                        help="Measure UI event-loop latency instead of throughput")
+    parser.add_argument('--startup', action='store_true',
+                        help="Measure app start-up time in fresh interpreters instead")
+    parser.add_argument('--runs', type=int, default=5,
+                        help="Cold starts to take the median of with --startup (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="Print one JSON report per batch size")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.startup:
+        report = run_startup_benchmark(args.runs)
+        if args.json:
+            print(json.dumps(report), flush=True)
+        else:
+            print_startup_report(report)
+        return 0
+
+    args.types = ('video', 'audio') if args.types == 'both' else (args.types,)
+    profiler = Profiler() if args.profile else None
+
+    for count in args.batch_sizes:
+        if args.ui:
+            report = run_ui_benchmark(count, args)
+        else:
+            report = run_batch_benchmark(count, args, profiler)
+        if args.json:
+            print(json.dumps(report), flush=True)
+        elif args.ui:
+            print_ui_report(report)
+        else:
+            print_batch_report(report)
+
+    if profiler is not None and profiler.dump(args.profile) is not None:
+        print(f"\n📊 Profile written to {args.profile}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Start-up time of the app, measured in fresh interpreters
+
+Each run starts a new Python process (``python -m benchmarks.startup app``)
+that imports the app module, builds the window when a display is available
+and waits for the background engine loader. An ``eager`` run imports
+``downloader.engine`` up front, the way the app used to before its window
+could show.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_app():
+    """Time the app's start-up in this process; returns seconds since the start"""
+    started = time.perf_counter()
+    import youtube_video_downloader as app_module
+    result = {'import': time.perf_counter() - started, 'window': None}
+
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception:
+        root = None
+
+    if root is not None:
+        app = app_module.YouTubeDownloaderApp(root)
+        root.update()
+        result['window'] = time.perf_counter() - started
+        loader = app.loader
+    else:
+        from downloader.warmup import EngineLoader
+        loader = EngineLoader()
+    loader.wait()
+    result['engine_ready'] = time.perf_counter() - started
+    if root is not None:
+        root.destroy()
+    return result
+
+
+def measure_eager():
+    started = time.perf_counter()
+    import downloader.engine  # noqa: F401
+    from yt_dlp.extractor import gen_extractor_classes
+
+    gen_extractor_classes()
+    return {'engine_ready': time.perf_counter() - started}
+
+
+def run_child(mode):
+    """Run one measurement in a new interpreter; also times the whole process"""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', mode], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+
+def run_startup_benchmark(runs=5):
+    """Measure ``runs`` cold starts of the app and of an eager engine import"""
+    report = {'runs': runs}
+    for mode in ('app', 'eager'):
+        results = [run_child(mode) for _ in range(runs)]
+        for key in results[0]:
+            values = [result[key] for result in results if result[key] is not None]
+            report[f'{mode}_{key}'] = statistics.median(values) if values else None
+    return report
+
+
+def print_startup_report(report):
+    def ms(key):
+        value = report[key]
+        return f"{value * 1000:7.1f} ms" if value is not None else "    n/a   "
+
+    print(f"\n🚀 Start-up, median of {report['runs']} cold run(s)")
+    print(f"   App module imported:   {ms('app_import')}")
+    print(f"   Window shown:          {ms('app_window')}")
+    print(f"   Engine ready:          {ms('app_engine_ready')} (loaded in the background)")
+    print(f"   Eager engine import:   {ms('eager_engine_ready')} (before the window could show)")
+    print(f"   Interpreter and app:   {ms('app_process')} per process")
+
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'app'
+    print(json.dumps(measure_app() if mode == 'app' else measure_eager()))
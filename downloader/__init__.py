@@ -0,0 +1,3 @@
+"""
+Download engine for the YouTube Video & Audio Downloader
+"""
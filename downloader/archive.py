@@ -0,0 +1,120 @@
+"""
+Persistent index of finished downloads, used to skip videos fetched before
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from downloader.paths import get_data_path
+
+VIDEO_EXTS = ('mp4', 'mkv', 'webm', 'mov', 'flv', '3gp')
+AUDIO_EXTS = ('mp3', 'm4a', 'wav', 'opus', 'aac', 'ogg', 'flac')
+# Matches the "[<id>]" suffix of yt-dlp's default "%(title)s [%(id)s].%(ext)s" names
+FILENAME_ID_RE = re.compile(r'\[([\w-]{11})\]$')
+# Variant used for scanned files whose quality is unknown; matches any quality
+ANY_VARIANT = '*'
+
+
+def get_download_type(ext):
+    """Guess the download type of a file from its extension, or None"""
+    ext = ext.lower().lstrip('.')
+    if ext in VIDEO_EXTS:
+        return 'video'
+    if ext in AUDIO_EXTS:
+        return 'audio'
+    return None
+
+
+class DownloadArchive:
+    """SQLite index of finished downloads keyed by (video ID, download type, variant)
+
+    ``variant`` is the video quality or audio format of the download, so the
+    same video can be fetched again in a different quality or format. Only
+    files found by ``scan_folder`` that carry their video ID in their name
+    are indexed; a title alone may belong to any video.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_data_path('download_archive.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    video_id TEXT NOT NULL,
+                    download_type TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    filename TEXT,
+                    title TEXT,
+                    downloaded_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, download_type, variant)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scanned_folders (
+                    folder TEXT PRIMARY KEY,
+                    scanned_at REAL NOT NULL
+                )""")
+
+    def contains(self, video_id, download_type, variant):
+        """Check whether a video was already downloaded as this type and variant"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM downloads WHERE video_id = ? AND download_type = ? AND variant IN (?, ?)",
+                (video_id, download_type, variant, ANY_VARIANT)).fetchone()
+        return row is not None
+
+    def add(self, video_id, download_type, variant, filename=None, title=None):
+        """Record a successful download"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, download_type, variant, filename, title, time.time()))
+
+    def is_scanned(self, folder):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM scanned_folders WHERE folder = ?",
+                                     (os.path.abspath(folder),)).fetchone()
+        return row is not None
+
+    def ensure_scanned(self, folder):
+        """Index the files in a folder unless it was scanned before; returns the number indexed"""
+        if self.is_scanned(folder):
+            return 0
+        return self.scan_folder(folder)
+
+    def scan_folder(self, folder):
+        """Index the media files already in a folder by the video ID in their names
+
+        Returns the number indexed.
+        """
+        folder = os.path.abspath(folder)
+        downloads = []
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            ext = ext.lstrip('.').lower()
+            download_type = get_download_type(ext)
+            if download_type is None:
+                continue
+            match = FILENAME_ID_RE.search(stem)
+            if match:
+                variant = ext if download_type == 'audio' else ANY_VARIANT
+                downloads.append((match.group(1), download_type, variant, entry.path, None, time.time()))
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO downloads VALUES (?, ?, ?, ?, ?, ?)", downloads)
+            self._conn.execute("INSERT OR REPLACE INTO scanned_folders VALUES (?, ?)", (folder, time.time()))
+        return len(downloads)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
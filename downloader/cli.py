@@ -0,0 +1,284 @@
+"""
+Command line front end for the download engine
+
+Usage:
+    python -m downloader urls.txt -o ~/Videos --audio --audio-format M4A -j 4
+    python -m downloader jobs.jsonl
+    python -m downloader --resume
+    python -m downloader --serve --port 8765
+
+A URL file has one URL per line (blank lines and lines starting with '#'
+are ignored). A JSONL job list has one object per line:
+
+    {"url": "https://youtu.be/...", "type": "audio", "audio_format": "opus"}
+    {"url": "https://youtu.be/...", "type": "video", "quality": "720p", "priority": 10}
+
+"type" may be omitted, in which case the --video/--audio flags apply. Jobs
+with a higher "priority" start first (default 0). Lines that are not valid
+jobs are reported and skipped.
+
+With --serve, batches are submitted over a local HTTP/JSON API instead
+(see ``downloader.service``); the other options become their defaults.
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from yt_dlp.utils import parse_bytes
+
+from downloader.engine import DownloadEngine, open_job_journal
+from downloader.metrics import MetricsCollector
+from downloader.options import AUDIO_FORMATS, METADATA_CACHE_TTL, VIDEO_QUALITIES, DownloadOptions
+from downloader.output import MIN_FREE_SPACE
+from downloader.profiling import Profiler
+from downloader.scheduler import DownloadJob
+from downloader.service import RequestError, parse_job_entry, serve
+from downloader.sessions import SessionPool
+
+
+def read_jobs(path, download_types):
+    """Read a URL file or JSONL job list into download jobs
+
+    Invalid lines are reported on stderr with their line number and left
+    out; the jobs of the other lines are still returned.
+    """
+    jobs = []
+    url_indexes = {}
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            try:
+                if line.startswith(('{', '[')):
+                    try:
+                        spec = json.loads(line)
+                    except ValueError as e:
+                        raise RequestError(400, f"invalid JSON: {e}")
+                else:
+                    spec = {'url': line}
+                # The same checks as jobs submitted to the service
+                url, types, priority = parse_job_entry(spec, download_types)
+            except RequestError as e:
+                print(f"{path}:{line_number}: {e}; line skipped", file=sys.stderr)
+                continue
+
+            url_index = url_indexes.setdefault(url, len(url_indexes) + 1)
+            for download_type in types:
+                jobs.append(DownloadJob(url, download_type, url_index,
+                                        quality=spec.get('quality'),
+                                        audio_format=spec.get('audio_format'),
+                                        priority=priority))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return jobs
+
+
+_print_lock = threading.Lock()
+
+
+def print_event(event):
+    """Print engine log events to stdout"""
+    if event['type'] == 'log':
+        with _print_lock:
+            print(event['message'], flush=True)
+
+
+def parse_rate(value):
+    rate = parse_bytes(value)
+    if rate is None:
+        raise argparse.ArgumentTypeError(f"invalid rate {value!r}")
+    return rate
+
+
+def parse_size(value):
+    size = parse_bytes(value)
+    if size is None:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r}")
+    return size
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m downloader',
+        description="Download YouTube videos and audio without the GUI")
+    parser.add_argument('input', nargs='?', help="URL file or JSONL job list ('-' for stdin)")
+    parser.add_argument('-o', '--output', help="Download folder (default: ~/Downloads)")
+    parser.add_argument('--video', dest='video', action='store_true', default=None,
+                        help="Download video (default unless --audio is given)")
+    parser.add_argument('--no-video', dest='video', action='store_false',
+                        help="Do not download video")
+    parser.add_argument('--audio', action='store_true', help="Download audio")
+    parser.add_argument('--quality', default="1080p", choices=VIDEO_QUALITIES,
+                        help="Video quality (default: %(default)s)")
+    parser.add_argument('--audio-format', default="MP3", type=str.upper, choices=AUDIO_FORMATS,
+                        help="Audio format (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=3,
+                        help="Number of parallel downloads (default: %(default)s)")
+    parser.add_argument('--max-jobs', type=int, default=8,
+                        help="Most parallel downloads adaptive concurrency may raise -j to (default: %(default)s)")
+    parser.add_argument('--no-adaptive', dest='adaptive_concurrency', action='store_false',
+                        help="Keep -j parallel downloads even when the server throttles")
+    parser.add_argument('--retries', type=int, default=3,
+                        help="Retries per job after throttling or network errors (default: %(default)s)")
+    parser.add_argument('--connections', type=int, default=0,
+                        help="Fetch large files over this many parallel range requests (default: off)")
+    parser.add_argument('-r', '--limit-rate', type=parse_rate, default=0, metavar='RATE',
+                        help="Total bandwidth limit for all downloads, e.g. 500K or 4.2M bytes/s")
+    parser.add_argument('--min-free-space', type=parse_size, default=MIN_FREE_SPACE, metavar='SIZE',
+                        help="Disk space to leave free in the download folder, e.g. 2G (default: 512M)")
+    parser.add_argument('--preallocate', action='store_true',
+                        help="Reserve the full size of large files before downloading them "
+                             "(uses the range downloader on one connection without --connections)")
+    parser.add_argument('--metadata-ttl', type=float, default=METADATA_CACHE_TTL / 3600, metavar='HOURS',
+                        help="Hours cached video info is reused before extracting again (default: %(default)g)")
+    parser.add_argument('--session-uses', type=int, default=50, metavar='N',
+                        help="Jobs a pooled yt-dlp session serves before it is rebuilt (default: %(default)s)")
+    parser.add_argument('--sync', action='store_true',
+                        help="Only download channel/playlist videos that earlier --sync runs did not list")
+    parser.add_argument('--separate-audio', dest='derive_audio', action='store_false',
+                        help="Download audio separately instead of extracting it from the video")
+    parser.add_argument('--no-archive', dest='use_archive', action='store_false',
+                        help="Download again even if the archive says a video was already fetched")
+    parser.add_argument('--serve', action='store_true',
+                        help="Accept batches over a local HTTP/JSON API instead of reading an input file")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Address the --serve API listens on (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=8765,
+                        help="Port the --serve API listens on (default: %(default)s)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume the last interrupted batch instead of reading an input file")
+    parser.add_argument('--no-journal', dest='use_journal', action='store_false',
+                        help="Do not journal jobs (the batch cannot be resumed after a crash)")
+    parser.add_argument('--metrics-jsonl', metavar='PATH',
+                        help="Append per-job timings and counters to this JSONL file")
+    parser.add_argument('--metrics-prom', metavar='PATH',
+                        help="Write batch totals to this Prometheus textfile")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Profile downloads and conversions with cProfile and write the stats here")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show yt-dlp output")
+    return parser
+
+
+def print_result(result):
+    print(f"\n{result.success_count - result.skipped_count} file(s) downloaded from {result.completed_urls} URL(s)")
+    if result.skipped_count:
+        print(f"⏭️ Skipped {result.skipped_count} already downloaded file(s)")
+    if result.failed_urls:
+        print(f"❌ Failed URLs: {len(result.failed_urls)}")
+        for url in result.failed_urls:
+            print(f"   - {url}")
+    return 0 if not (result.failed_jobs or result.failed_urls) else 1
+
+
+def create_monitoring(args):
+    """Create the metrics collector and profiler requested on the command line"""
+    metrics = None
+    if args.metrics_jsonl or args.metrics_prom:
+        metrics = MetricsCollector(jsonl_path=args.metrics_jsonl, prometheus_path=args.metrics_prom)
+    profiler = Profiler() if args.profile else None
+    return metrics, profiler
+
+
+def create_engine(options, args, journal=None, listener=print_event, monitoring=None,
+                  sessions=None):
+    """Create an engine with the metrics and profiling requested on the command line"""
+    metrics, profiler = monitoring or create_monitoring(args)
+    return DownloadEngine(options, listener=listener, journal=journal, metrics=metrics,
+                          profiler=profiler, sessions=sessions)
+
+
+def build_options(args):
+    return DownloadOptions(download_folder=args.output, video_quality=args.quality,
+                           audio_format=args.audio_format, max_workers=args.jobs,
+                           quiet=not args.verbose, use_archive=args.use_archive,
+                           use_journal=args.use_journal, range_connections=args.connections,
+                           rate_limit=args.limit_rate, derive_audio=args.derive_audio,
+                           adaptive_concurrency=args.adaptive_concurrency,
+                           max_workers_limit=args.max_jobs, max_retries=args.retries,
+                           min_free_space=args.min_free_space, preallocate=args.preallocate,
+                           session_max_uses=args.session_uses, sync=args.sync,
+                           metadata_ttl=args.metadata_ttl * 3600)
+
+
+def write_profile(profiler, path):
+    if profiler is None or profiler.dump(path) is None:
+        return
+    print(f"📊 Profile written to {path}")
+    if profiler.skipped:
+        print(f"   {profiler.skipped} section(s) ran unprofiled while another thread was profiling")
+
+
+def run_service(args):
+    """Serve the HTTP API; every batch shares one metrics collector, profiler and session pool"""
+    monitoring = create_monitoring(args)
+    sessions = SessionPool(args.session_uses)
+
+    def create_service_engine(options, listener):
+        def print_and_forward(event):
+            print_event(event)
+            listener(event)
+        return create_engine(options, args, listener=print_and_forward, monitoring=monitoring,
+                             sessions=sessions)
+
+    status = serve(args.host, args.port, build_options(args), create_service_engine)
+    sessions.close()
+    write_profile(monitoring[1], args.profile)
+    return status
+
+
+def run(engine, args, batch_id=None, jobs=None):
+    """Run or resume a batch, then print its result and write the profile"""
+    result = engine.resume_batch(batch_id) if batch_id else engine.run_batch(jobs)
+    write_profile(engine.profiler, args.profile)
+    return print_result(result)
+
+
+def resume(args):
+    """Resume the last interrupted batch with the options it was started with"""
+    journal = open_job_journal()
+    unfinished = journal.get_unfinished_batch() if journal else None
+    if unfinished is None:
+        print("No interrupted batch to resume")
+        return 0
+
+    batch_id, stored_options, pending = unfinished
+    options = DownloadOptions.from_dict(stored_options)
+    options.quiet = not args.verbose
+    engine = create_engine(options, args, journal=journal)
+    return run(engine, args, batch_id=batch_id)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.resume:
+        return resume(args)
+    if args.serve:
+        return run_service(args)
+    if not args.input:
+        parser.error("an input file is required unless --resume or --serve is given")
+
+    video = args.video if args.video is not None else not args.audio
+    download_types = [t for t, selected in (('video', video), ('audio', args.audio)) if selected]
+    if not download_types:
+        print("Nothing to download: select --video and/or --audio", file=sys.stderr)
+        return 2
+
+    try:
+        jobs = read_jobs(args.input, download_types)
+    except (OSError, ValueError) as e:
+        print(f"Could not read jobs: {e}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print("No URLs to download", file=sys.stderr)
+        return 2
+
+    engine = create_engine(build_options(args), args)
+    return run(engine, args, jobs=jobs)
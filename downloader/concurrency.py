@@ -0,0 +1,164 @@
+"""
+Error classification, retry backoff and adaptive (AIMD) concurrency
+
+Failures are sorted into three kinds:
+
+- ``throttle``: the server is pushing back (HTTP 429/403, bot checks);
+  retry later with fewer downloads in parallel
+- ``transient``: network hiccups and server errors; retry later
+- ``permanent``: everything else (unavailable videos, missing formats,
+  conversion errors); retrying will not help
+
+``AIMDController`` halves the number of parallel downloads on throttling
+and adds one back at a time while downloads keep succeeding and the extra
+worker actually raises throughput.
+"""
+
+import random
+import re
+import socket
+import threading
+import time
+
+THROTTLE = 'throttle'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+THROTTLE_STATUSES = (403, 429)
+HTTP_STATUS_RE = re.compile(r'HTTP Error (\d{3})')
+THROTTLE_MESSAGES = ('too many requests', 'rate limit', 'confirm you’re not a bot',
+                     "confirm you're not a bot")
+TRANSIENT_MESSAGES = ('timed out', 'timeout', 'connection reset', 'connection aborted',
+                      'connection refused', 'remote end closed', 'incompleteread',
+                      'temporary failure', 'network is unreachable', 'broken pipe',
+                      'range download failed', 'got error', 'unable to connect')
+
+# Retry delays: BACKOFF_BASE * 2 ** attempt, capped, with +-50% jitter
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+THROTTLE_BACKOFF_BASE = 5.0
+
+
+def get_http_status(error):
+    """Get the HTTP status behind an error, or None"""
+    for candidate in (error, getattr(error, 'exc_info', None) and error.exc_info[1]):
+        status = getattr(candidate, 'status', None) or getattr(candidate, 'code', None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+    match = HTTP_STATUS_RE.search(str(error))
+    return int(match[1]) if match else None
+
+
+def classify_error(error):
+    """Sort a download error into THROTTLE, TRANSIENT or PERMANENT"""
+    status = get_http_status(error)
+    if status in THROTTLE_STATUSES:
+        return THROTTLE
+    if status is not None and (status >= 500 or status == 408):
+        return TRANSIENT
+
+    message = str(error).lower()
+    if any(text in message for text in THROTTLE_MESSAGES):
+        return THROTTLE
+
+    original = getattr(error, 'exc_info', None) and error.exc_info[1]
+    if isinstance(original or error, (socket.timeout, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    if any(text in message for text in TRANSIENT_MESSAGES):
+        return TRANSIENT
+    return PERMANENT
+
+
+def get_backoff_delay(attempt, kind=TRANSIENT):
+    """Get a jittered delay in seconds before retry number ``attempt`` (from 0)"""
+    base = THROTTLE_BACKOFF_BASE if kind == THROTTLE else BACKOFF_BASE
+    delay = min(BACKOFF_CAP, base * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.5)
+
+
+class AIMDController:
+    """Adjust a concurrency limit from throttle signals and throughput
+
+    Additive increase: after ``limit`` successful jobs in a row, with no
+    throttling for ``cooldown`` seconds, the limit goes up by one, but only
+    if the last increase raised throughput by at least ``min_gain`` (or
+    ``probe_interval`` seconds have passed since it did not).
+    Multiplicative decrease: a throttled job halves the limit, at most
+    once per ``cooldown`` so a burst of 429s from parallel jobs counts once.
+
+    ``get_throughput`` returns the current bytes per second (or None) and
+    ``on_change`` is called with the new limit.
+    """
+    def __init__(self, initial, minimum=1, maximum=8, get_throughput=None, on_change=None,
+                 cooldown=10.0, min_gain=0.05, probe_interval=60.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.get_throughput = get_throughput
+        self.on_change = on_change
+        self.cooldown = cooldown
+        self.min_gain = min_gain
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._successes = 0
+        self._last_change = time.monotonic()
+        self._last_throttle = None
+        self._throughput_before_increase = None
+        self._stalled_since = None
+
+    def record_success(self):
+        """Count a finished job and maybe allow one more in parallel"""
+        with self._lock:
+            self._successes += 1
+            now = time.monotonic()
+            if self._successes < self.limit or self.limit >= self.maximum:
+                return
+            if now - self._last_change < self.cooldown:
+                return
+            if self._last_throttle is not None and now - self._last_throttle < self.cooldown:
+                return
+            self._successes = 0
+            if not self._increase_helped(now):
+                return
+            new_limit = self.limit + 1
+        self._set_limit(new_limit)
+
+    def record_throttle(self):
+        """Halve the limit after the server pushed back"""
+        with self._lock:
+            now = time.monotonic()
+            self._successes = 0
+            recently_throttled = self._last_throttle is not None and now - self._last_throttle < self.cooldown
+            self._last_throttle = now
+            if recently_throttled or self.limit <= self.minimum:
+                return
+            self._throughput_before_increase = None
+            new_limit = max(self.minimum, self.limit // 2)
+        self._set_limit(new_limit)
+
+    def _increase_helped(self, now):
+        """Check throughput before adding a worker; records the new baseline"""
+        throughput = self.get_throughput() if self.get_throughput else None
+        baseline = self._throughput_before_increase
+        if throughput is None or baseline is None or throughput >= baseline * (1 + self.min_gain):
+            self._throughput_before_increase = throughput
+            self._stalled_since = None
+            return True
+        # More workers stopped helping: hold, but probe again now and then
+        if self._stalled_since is None:
+            self._stalled_since = now
+        if now - self._stalled_since >= self.probe_interval:
+            self._throughput_before_increase = throughput
+            self._stalled_since = None
+            return True
+        return False
+
+    def _set_limit(self, limit):
+        with self._lock:
+            if limit == self.limit:
+                return
+            self.limit = limit
+            self._last_change = time.monotonic()
+        if self.on_change:
+            self.on_change(limit)
@@ -0,0 +1,875 @@
+"""
+Headless download engine
+
+The engine owns everything needed to run a batch: building yt-dlp options,
+sharing metadata between jobs and scheduling jobs on the worker pool. Front
+ends (the Tk app, the CLI) only pass options in and listen to events.
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+import yt_dlp
+
+from downloader.archive import DownloadArchive
+from downloader.concurrency import (PERMANENT, THROTTLE, TRANSIENT, AIMDController,
+                                    classify_error, get_backoff_delay)
+from downloader.extraction import MetadataStore
+from downloader.journal import JobJournal
+from downloader.metadata_cache import MetadataCache
+from downloader.options import METADATA_CACHE_TTL, DownloadOptions
+from downloader.output import (PREALLOCATE_MIN_SIZE, WRITE_BUFFER_SIZE, InsufficientSpaceError,
+                               OutputFolder, get_staging_key, is_staging_path)
+from downloader.playlist import is_collection_url, iter_entries
+from downloader.postprocess import (AUDIO_FORMAT_SELECTORS, PostProcessPipeline, convert_audio,
+                                    get_audio_conversion, is_stream_copy)
+from downloader.progress import BatchProgress, PostProcessHistory, estimate_download_size
+from downloader.ratelimit import global_limiter
+from downloader.scheduler import BatchScheduler, DownloadJob, JobState
+from downloader.sessions import SessionPool
+from downloader.sync import SyncState
+from downloader.urls import canonical_video_id
+
+
+class JobCancelled(yt_dlp.utils.DownloadCancelled):
+    """Raised inside a job's download when the job is cancelled"""
+    msg = "Cancelled"
+
+
+class BatchResult:
+    """Outcome of a finished batch"""
+    def __init__(self, jobs, completed_urls, failed_urls, cancelled=False):
+        self.jobs = jobs
+        self.completed_urls = completed_urls
+        self.failed_urls = failed_urls
+        self.cancelled = cancelled
+
+    @property
+    def success_count(self):
+        return sum(1 for job in self.jobs if job.state == JobState.DONE)
+
+    @property
+    def skipped_count(self):
+        return sum(1 for job in self.jobs if job.skipped)
+
+    @property
+    def failed_jobs(self):
+        return [job for job in self.jobs if job.state == JobState.FAILED]
+
+
+def build_ydl_opts(download_type, options, quality=None, audio_format=None):
+    """Get yt-dlp options based on download type
+
+    Audio conversions are not run inside yt-dlp; the engine hands them to
+    its ``PostProcessPipeline`` once the download is done.
+    """
+    if download_type == 'video':
+        quality = quality or options.video_quality
+        height = quality.lower().replace('p', '')
+        format_str = f'best[height<={height}]/best'
+    else:  # audio
+        audio_format = (audio_format or options.audio_format).lower()
+        # Prefer a source stream that only needs remuxing into the target format
+        format_str = AUDIO_FORMAT_SELECTORS.get(audio_format, AUDIO_FORMAT_SELECTORS['m4a'])
+
+    opts = {
+        'format': format_str,
+        'outtmpl': '%(title)s.%(ext)s',
+        'paths': {'home': options.download_folder},
+        'buffersize': WRITE_BUFFER_SIZE,
+        'ignoreerrors': False,
+        'no_warnings': options.quiet,
+        'quiet': options.quiet,
+        'noprogress': options.quiet,
+    }
+
+    if options.range_connections:
+        opts['range_download'] = {'connections': options.range_connections}
+    elif options.preallocate:
+        # A single connection, just for the preallocated file and offset writes
+        opts['range_download'] = {'connections': 1, 'min_size': PREALLOCATE_MIN_SIZE}
+
+    return opts
+
+
+def is_expired_stream_error(error):
+    """Check whether a download error looks like an expired stream URL"""
+    message = str(error)
+    return 'HTTP Error 403' in message or 'HTTP Error 410' in message
+
+
+def open_metadata_cache(ttl=METADATA_CACHE_TTL):
+    """Open the default on-disk metadata cache, or None if it is unavailable"""
+    try:
+        return MetadataCache(ttl=ttl)
+    except Exception:
+        return None
+
+
+def open_download_archive():
+    """Open the default download archive, or None if it is unavailable"""
+    try:
+        return DownloadArchive()
+    except Exception:
+        return None
+
+
+def open_job_journal():
+    """Open the default job journal, or None if it is unavailable"""
+    try:
+        return JobJournal()
+    except Exception:
+        return None
+
+
+def open_sync_state():
+    """Open the default channel/playlist sync state, or None if it is unavailable"""
+    try:
+        return SyncState()
+    except Exception:
+        return None
+
+
+def open_postprocess_history():
+    """Open the default post-processing time history, or None if it is unavailable"""
+    try:
+        return PostProcessHistory()
+    except Exception:
+        return None
+
+
+class DownloadEngine:
+    """Run batches of download jobs without any UI
+
+    ``listener`` is called with an event dict for everything a front end may
+    want to show. Every event has a ``type``:
+
+    - ``log``: ``message``
+    - ``job_state``: ``job`` (the job moved to a new ``JobState``)
+    - ``progress``: ``job``, ``downloaded_bytes``, ``total_bytes``, ``batch_progress``,
+      ``speed`` (bytes/s, or None), ``eta`` (seconds, or None)
+    - ``file_downloaded``: ``job``, ``filename``
+    - ``job_finished``: ``job``
+    - ``retry``: ``job``, ``error``, ``kind`` (the job is trying again after ``error``,
+      which ``classify_error`` put down as ``throttle`` or ``transient``)
+    - ``concurrency``: ``limit`` (the number of parallel downloads changed)
+    - ``url_finished``: ``url_index``, ``url``, ``success``
+    - ``collection_progress``: ``url``, ``listed``, ``done``, ``failed``, ``listing_finished``
+    - ``batch_finished``: ``result``
+
+    Playlist and channel URLs are listed lazily on their own thread and each
+    video is queued as soon as it is listed, so downloads start while later
+    pages are still being fetched. With the ``sync`` option only videos that
+    earlier syncs did not list are queued (see ``CollectionSync``).
+
+    With a ``JobJournal`` every job state change is written to disk, so an
+    interrupted batch can be picked up again with ``resume_batch``.
+
+    All workers draw from one ``TokenBucket`` (the process-wide one unless
+    ``limiter`` is given), and queued jobs can be reprioritized while the
+    batch runs.
+
+    Audio conversions run on the ``PostProcessPipeline`` so a worker starts
+    its next download while ffmpeg is still busy with the last one. When a
+    URL has both a video and an audio job and ffmpeg is installed, only the
+    video is downloaded and the audio is extracted from it on the pipeline.
+
+    Batch progress is weighted by bytes (see ``BatchProgress``); the ETA
+    includes post-processing time learned from earlier runs in ``history``.
+
+    Jobs download into their own staging directory in the download folder
+    and their finished files are moved out without replacing existing ones
+    (see ``OutputFolder``). A batch does not start, and a job does not
+    download, without enough free disk space.
+
+    Extractions and downloads borrow YoutubeDL sessions from a
+    ``SessionPool`` (one per engine unless ``sessions`` is given), so
+    cookies, extractor state and connections carry over between URLs.
+
+    A ``MetricsCollector`` sees every event before the listener does, and
+    a ``Profiler`` wraps each job's download and conversion in cProfile.
+
+    ``cancel_job`` and ``cancel_batch`` stop jobs: queued ones at once,
+    running ones at their next progress update.
+
+    Failed downloads are retried with jittered backoff unless their error
+    is permanent. With ``adaptive_concurrency`` an ``AIMDController`` halves
+    the parallel downloads when the server throttles and adds them back
+    while throughput improves.
+
+    Events are emitted from worker threads.
+    """
+    def __init__(self, options=None, listener=None, metadata=None, archive=None, journal=None,
+                 limiter=None, postprocessor=None, metrics=None, profiler=None, history=None,
+                 sessions=None, sync_state=None):
+        self.options = options or DownloadOptions()
+        self.listener = listener
+        # Sessions of a pool we created are closed after each batch
+        self.owns_sessions = sessions is None
+        self.sessions = sessions or SessionPool(self.options.session_max_uses)
+        self.metadata = metadata or MetadataStore(cache=open_metadata_cache(self.options.metadata_ttl),
+                                                   sessions=self.sessions)
+        if archive is None and self.options.use_archive:
+            archive = open_download_archive()
+        self.archive = archive
+        if journal is None and self.options.use_journal:
+            journal = open_job_journal()
+        self.journal = journal
+        if sync_state is None and self.options.sync:
+            sync_state = open_sync_state()
+        self.sync_state = sync_state
+        self.batch_id = None
+        self.limiter = limiter or global_limiter
+        self.postprocessor = postprocessor or PostProcessPipeline()
+        self.metrics = metrics
+        self.profiler = profiler
+        self.history = history or open_postprocess_history()
+        self.progress = BatchProgress(self.history)
+        self.scheduler = None
+        self.concurrency = None
+        self.cancelled = False
+        self.output = OutputFolder(self.options.download_folder, self.options.min_free_space)
+
+        self.jobs = []
+        self.jobs_by_url = {}
+        self.total_urls = 0
+        self.completed_urls = 0
+        self.collections = {}
+        self.syncs = {}
+        self._next_url_index = 1
+        self._claimed = {}
+        self._lock = threading.Lock()
+        # Notified whenever a job finishes, for jobs waiting on a claimed video
+        self._claims_changed = threading.Condition(self._lock)
+
+    def emit(self, event_type, **data):
+        """Send an event to the metrics collector and the listener"""
+        data['type'] = event_type
+        if self.metrics is not None:
+            try:
+                self.metrics.record(data)
+            except Exception:
+                # Metrics must never break a download
+                pass
+        if self.listener:
+            self.listener(data)
+
+    def log(self, message):
+        self.emit('log', message=message)
+
+    def build_jobs(self, urls, video=True, audio=False):
+        """Create one download job per URL and selected download type"""
+        jobs = []
+        for i, url in enumerate(urls, start=1):
+            if video:
+                jobs.append(DownloadJob(url, 'video', i))
+            if audio:
+                jobs.append(DownloadJob(url, 'audio', i))
+        return jobs
+
+    def run_batch(self, jobs, batch_id=None):
+        """Download every job and wait for the batch to finish
+
+        ``batch_id`` continues a batch already recorded in the journal.
+        """
+        self.metadata.clear()
+        jobs = list(jobs)
+        direct_jobs = []
+        collection_jobs = {}
+        for job in jobs:
+            if is_collection_url(job.url):
+                collection_jobs.setdefault(job.url_index, []).append(job)
+            else:
+                direct_jobs.append(job)
+
+        with self._lock:
+            self.jobs = []
+            self.jobs_by_url = {}
+            self.completed_urls = 0
+            self.collections = {}
+            self.syncs = {}
+            self._claimed = {}
+            # self.cancelled is not reset; a cancel that came before the batch
+            # started still applies (see finish_cancel)
+            # Listed videos are numbered after the URLs the caller passed in
+            self._next_url_index = max((job.url_index for job in jobs), default=0) + 1
+            self.total_urls = self._next_url_index - 1
+
+        max_workers = max(1, int(self.options.max_workers))
+        self.log(f"🚀 Starting batch download of {self.total_urls} URL(s)")
+        self.log(f"⚙️ Running up to {max_workers} download(s) in parallel")
+        if self.archive is not None:
+            indexed = self.archive.ensure_scanned(self.options.download_folder)
+            if indexed:
+                self.log(f"🗂️ Indexed {indexed} existing file(s) in {self.options.download_folder}")
+
+        self.output = OutputFolder(self.options.download_folder, self.options.min_free_space)
+        try:
+            self.output.check_free_space()
+        except InsufficientSpaceError as e:
+            self.log(f"❌ {e}")
+            return self.fail_batch(jobs, e)
+
+        if self.journal is not None:
+            self.batch_id = batch_id or self.journal.start_batch(self.options.to_dict())
+            self.journal.add_jobs(self.batch_id, direct_jobs)
+            for placeholders in collection_jobs.values():
+                self.journal.add_jobs(self.batch_id, placeholders, is_collection=True)
+
+        self.limiter.set_rate(self.options.rate_limit)
+        self.progress = BatchProgress(self.history, self.postprocessor.max_workers)
+        scheduler = self.scheduler = BatchScheduler(self.run_job, max_workers=max_workers,
+                                                    on_job_done=self.on_job_done)
+        self.concurrency = None
+        if self.options.adaptive_concurrency:
+            self.concurrency = AIMDController(
+                max_workers, maximum=max(max_workers, int(self.options.max_workers_limit)),
+                get_throughput=lambda: self.progress.speed, on_change=self.set_concurrency)
+        self.add_jobs(direct_jobs)
+        if self.cancelled:
+            # Cancelled before its jobs were registered; they fail as soon as they start
+            self.cancel_batch()
+        for job in self.pair_jobs(direct_jobs):
+            scheduler.submit(job)
+
+        listers = []
+        for placeholders in collection_jobs.values():
+            thread = threading.Thread(target=self.expand_collection, args=(scheduler, placeholders),
+                                      name="playlist-lister")
+            thread.daemon = True
+            thread.start()
+            listers.append(thread)
+        for thread in listers:
+            thread.join()
+
+        scheduler.close()
+        scheduler.join()
+        self.postprocessor.shutdown()
+        if self.owns_sessions:
+            self.sessions.close()
+
+        failed_urls = [url_jobs[0].url for url_jobs in self.jobs_by_url.values()
+                       if not any(j.state == JobState.DONE for j in url_jobs)]
+        for placeholders in collection_jobs.values():
+            url = placeholders[0].url
+            stats = self.collections[url]
+            collection_failed = stats['error'] is not None or (stats['listed'] and stats['done'] == 0)
+            if collection_failed:
+                failed_urls.append(url)
+            for job in placeholders:
+                job.state = JobState.FAILED if collection_failed else JobState.DONE
+                if self.journal is not None:
+                    self.journal.update_job(job)
+
+        if self.journal is not None:
+            self.journal.finish_batch(self.batch_id)
+        if self.history is not None:
+            try:
+                self.history.save()
+            except OSError:
+                pass
+
+        result = BatchResult(self.jobs, self.completed_urls, failed_urls, self.finish_cancel())
+        self.emit('batch_finished', result=result)
+        return result
+
+    def fail_batch(self, jobs, error):
+        """Finish a batch that could not start by failing every job with ``error``"""
+        with self._lock:
+            self.jobs = jobs
+        for job in jobs:
+            job.error = error
+            job.state = JobState.FAILED
+            self.emit('job_finished', job=job)
+        result = BatchResult(jobs, 0, list(dict.fromkeys(job.url for job in jobs)),
+                             self.finish_cancel())
+        self.emit('batch_finished', result=result)
+        return result
+
+    def resume_batch(self, batch_id):
+        """Continue an interrupted batch from the journal
+
+        Finished jobs are skipped; interrupted downloads continue from their
+        existing ``.part`` files.
+        """
+        jobs = self.journal.load_pending_jobs(batch_id)
+        self.log(f"♻️ Resuming interrupted batch with {len(jobs)} pending job(s)")
+        return self.run_batch(jobs, batch_id=batch_id)
+
+    def discard_batch(self, batch_id):
+        """Give up on an interrupted batch and delete its partial downloads"""
+        for filename in self.journal.get_partial_files(batch_id):
+            for path in (filename, filename + '.ytdl'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            if is_staging_path(filename):
+                self.output.discard(os.path.dirname(filename))
+        self.journal.finish_batch(batch_id)
+
+    def set_rate_limit(self, rate):
+        """Change the bandwidth limit (bytes per second, 0 for none) of running downloads"""
+        self.options.rate_limit = rate
+        self.limiter.set_rate(rate)
+
+    def set_priority(self, job_id, priority):
+        """Change the priority of a queued job; returns False if it is not queued"""
+        return self.scheduler is not None and self.scheduler.set_priority(job_id, priority)
+
+    def prioritize(self, job_id):
+        """Make a queued job the next one to start; returns False if it is not queued"""
+        return self.scheduler is not None and self.scheduler.move_to_front(job_id)
+
+    def queued_jobs(self):
+        """Get the jobs waiting to start, in the order they will run"""
+        return self.scheduler.queued_jobs() if self.scheduler is not None else []
+
+    def cancel_job(self, job_id):
+        """Cancel an unfinished job of the batch; returns False if there is none"""
+        with self._lock:
+            job = next((j for j in self.jobs if j.job_id == job_id), None)
+        if job is None or not self._cancel(job):
+            return False
+        self.log(f"🛑 Cancelled {job.download_type}: {job.title or job.url}")
+        return True
+
+    def cancel_batch(self):
+        """Cancel every unfinished job and stop listing playlists and channels
+
+        Called before ``run_batch`` registered its jobs, the batch is
+        cancelled as soon as it has.
+        """
+        self.cancelled = True
+        with self._lock:
+            jobs = list(self.jobs)
+        cancelled = sum(1 for job in jobs if self._cancel(job))
+        self.log(f"🛑 Cancelled {cancelled} job(s)")
+
+    def finish_cancel(self):
+        """Get whether the finished batch was cancelled and clear that for the next one"""
+        cancelled, self.cancelled = self.cancelled, False
+        return cancelled
+
+    def _cancel(self, job):
+        if job.finished or job.cancelled:
+            return False
+        job.cancelled = True
+        # A running job stops itself; see check_cancelled
+        if self.scheduler is not None:
+            self.scheduler.cancel(job.job_id, JobCancelled())
+        return True
+
+    def check_cancelled(self, job):
+        """Stop a job's work by raising ``JobCancelled`` if it was cancelled"""
+        if job.cancelled:
+            raise JobCancelled()
+
+    def set_concurrency(self, limit):
+        """Change how many downloads run in parallel"""
+        if self.scheduler is None:
+            return
+        previous = self.scheduler.max_workers
+        self.scheduler.set_max_workers(limit)
+        self.log(f"⚙️ Parallel downloads: {previous} → {limit}")
+        self.emit('concurrency', limit=limit)
+
+    def set_job_state(self, job, state, tmp_filename=None):
+        """Move a job to a new state and journal it"""
+        job.state = state
+        if state == JobState.POSTPROCESSING:
+            self.progress.start_postprocessing(job)
+        if self.journal is not None:
+            self.journal.update_job(job, tmp_filename=tmp_filename)
+        self.emit('job_state', job=job)
+
+    def pair_jobs(self, jobs):
+        """Attach audio jobs to the video job of the same URL
+
+        Returns the jobs that still need a worker of their own. Without
+        ffmpeg nothing can be extracted, so audio is downloaded on its own.
+        """
+        if not self.options.derive_audio or not self.postprocessor.ffmpeg:
+            return jobs
+        videos = {}
+        for job in jobs:
+            if job.download_type == 'video':
+                videos.setdefault(job.url_index, job)
+        queued = []
+        for job in jobs:
+            video_job = videos.get(job.url_index) if job.download_type == 'audio' else None
+            if video_job is not None:
+                video_job.derived_jobs.append(job)
+            else:
+                queued.append(job)
+        return queued
+
+    def add_jobs(self, jobs):
+        """Register jobs with the batch before they are submitted"""
+        with self._lock:
+            for job in jobs:
+                self.jobs.append(job)
+                self.jobs_by_url.setdefault(job.url_index, []).append(job)
+        for job in jobs:
+            self.emit('job_state', job=job)
+
+    def expand_collection(self, scheduler, placeholders):
+        """List a playlist or channel and queue a job per video as entries arrive
+
+        ``placeholders`` are the jobs the caller created for the collection
+        URL, one per download type; each listed video gets a copy of them.
+        """
+        url = placeholders[0].url
+        stats = {'listed': 0, 'done': 0, 'failed': 0, 'listing_finished': False, 'error': None}
+        with self._lock:
+            self.collections[url] = stats
+
+        sync = None
+        if self.sync_state is not None and self.options.sync:
+            sync = self.syncs[url] = self.sync_state.start(url)
+        if sync is not None and sync.stops_early and sync.newest_id:
+            since = sync.newest_id + (f" from {sync.newest_upload_date}" if sync.newest_upload_date else "")
+            self.log(f"📃 Listing videos from {url} newer than {since}")
+        else:
+            self.log(f"📃 Listing videos from {url}")
+        try:
+            entries = iter_entries(url, stop_at=sync.stop_at if sync is not None else None)
+            if sync is not None:
+                entries = sync.get_entries(entries)
+            for entry in entries:
+                if self.cancelled:
+                    break
+                with self._lock:
+                    url_index = self._next_url_index
+                    self._next_url_index += 1
+                    self.total_urls += 1
+                    stats['listed'] += 1
+
+                children = []
+                for placeholder in placeholders:
+                    child = DownloadJob(entry['url'], placeholder.download_type, url_index,
+                                        quality=placeholder.quality,
+                                        audio_format=placeholder.audio_format,
+                                        parent_url=url)
+                    child.title = entry.get('title')
+                    child.video_id = entry.get('id')
+                    children.append(child)
+                if self.journal is not None:
+                    self.journal.add_jobs(self.batch_id, children)
+                self.add_jobs(children)
+                for child in self.pair_jobs(children):
+                    scheduler.submit(child)
+                self.emit_collection_progress(url)
+        except Exception as e:
+            stats['error'] = e
+            self.log(f"❌ Error listing {url}: {str(e)}")
+        finally:
+            stats['listing_finished'] = True
+
+        if self.journal is not None and stats['error'] is None:
+            self.journal.mark_listed(placeholders)
+
+        if sync is None:
+            self.log(f"📃 Found {stats['listed']} video(s) in {url}")
+        else:
+            if stats['error'] is None and not self.cancelled:
+                sync.finish()
+            retried = stats['listed'] - sync.new_count
+            self.log(f"📃 Found {sync.new_count} new video(s) in {url}"
+                     + (f", retrying {retried} earlier one(s)" if retried > 0 else ""))
+        self.emit_collection_progress(url)
+
+    def emit_collection_progress(self, url):
+        stats = self.collections[url]
+        self.emit('collection_progress', url=url, listed=stats['listed'], done=stats['done'],
+                  failed=stats['failed'], listing_finished=stats['listing_finished'])
+
+    def profile(self):
+        """Get a context that profiles its body when profiling is enabled"""
+        return self.profiler.section() if self.profiler is not None else contextlib.nullcontext()
+
+    def run_job(self, job):
+        """Run a single download job on a worker thread"""
+        self.log(f"\n📥 Processing URL {job.url_index}/{self.total_urls} ({job.download_type}): {job.url}")
+        result = self.download_with_retries(job)
+        for derived_job in job.derived_jobs:
+            # Without a fresh video file the audio is downloaded after all
+            if derived_job.cancelled:
+                derived_job.error = JobCancelled()
+                self.scheduler.complete(derived_job, False)
+            elif result is True and job.filename and not job.skipped:
+                self.scheduler.complete(derived_job, self.derive_audio(job, derived_job))
+            else:
+                self.scheduler.complete(derived_job, self.run_job(derived_job))
+        return result
+
+    def download_with_retries(self, job):
+        """Download a job, retrying throttled and transient failures with backoff"""
+        attempt = 0
+        while True:
+            with self.profile():
+                result = self.download(job)
+            if result is not False:
+                if self.concurrency is not None and not job.skipped:
+                    self.concurrency.record_success()
+                return result
+            if job.cancelled:
+                return result
+
+            kind = classify_error(job.error)
+            if kind == THROTTLE and self.concurrency is not None:
+                self.concurrency.record_throttle()
+            if kind == PERMANENT or attempt >= self.options.max_retries:
+                return result
+
+            delay = get_backoff_delay(attempt, kind)
+            attempt += 1
+            self.log(f"🔁 Retrying in {delay:.1f}s ({kind}, attempt {attempt}/{self.options.max_retries}): "
+                     f"{job.title or job.url}")
+            self.emit('retry', job=job, error=job.error, kind=kind)
+            job.error = None
+            # Sleep in steps so a cancelled job does not wait out its backoff
+            deadline = time.monotonic() + delay
+            while not job.cancelled and time.monotonic() < deadline:
+                time.sleep(min(0.5, deadline - time.monotonic()))
+
+    def on_job_done(self, job):
+        """Record a finished job and report its URL once all of its jobs are done"""
+        if self.journal is not None:
+            self.journal.update_job(job)
+        self.output.release(job.job_id)
+        if job.state == JobState.FAILED and job.staging_dir:
+            # Only interrupted jobs are resumed; partial files of failed ones are garbage
+            self.output.discard(job.staging_dir)
+        self.progress.finish(job, self.get_progress_key(job))
+        self.emit('job_finished', job=job)
+        with self._lock:
+            self._claims_changed.notify_all()
+            url_jobs = self.jobs_by_url.get(job.url_index, [job])
+            if not all(j.finished for j in url_jobs):
+                return
+            url_succeeded = any(j.state == JobState.DONE for j in url_jobs)
+            if url_succeeded:
+                self.completed_urls += 1
+            stats = self.collections.get(job.parent_url)
+            if stats is not None:
+                stats['done' if url_succeeded else 'failed'] += 1
+            sync = self.syncs.get(job.parent_url)
+
+        self.metadata.release(job.url)
+        if sync is not None and job.video_id:
+            sync.set_status(job.video_id, url_succeeded)
+
+        if url_succeeded:
+            self.log(f"✅ URL {job.url_index} completed successfully")
+        else:
+            self.log(f"❌ URL {job.url_index} failed")
+        self.emit('url_finished', url_index=job.url_index, url=job.url, success=url_succeeded)
+        if stats is not None:
+            self.emit_collection_progress(job.parent_url)
+
+    def get_batch_progress(self):
+        """Get overall batch progress as a percentage of the expected bytes"""
+        return self.progress.get_percent(list(self.jobs))
+
+    def get_eta(self):
+        """Estimate the seconds left in the batch, or None if unknown"""
+        return self.progress.get_eta(list(self.jobs), self.get_progress_key)
+
+    def get_progress_key(self, job):
+        """Get the key post-processing times of a job are averaged under"""
+        return f"{job.download_type}:{self.get_variant(job)}"
+
+    def progress_hook(self, d, job):
+        """Progress callback for yt-dlp"""
+        self.check_cancelled(job)
+        if d['status'] == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes') or 0
+            if job.state != JobState.DOWNLOADING:
+                self.set_job_state(job, JobState.DOWNLOADING, tmp_filename=d.get('tmpfilename'))
+            with self._lock:
+                # A new stream of the same job restarts its byte count
+                delta = downloaded - job.downloaded_bytes if downloaded >= job.downloaded_bytes else downloaded
+                job.downloaded_bytes = downloaded
+                job.total_bytes = total
+            self.progress.add_bytes(job, delta, downloaded, total)
+            # Blocking here holds this download back while the shared bucket is empty
+            self.limiter.consume(delta)
+            if total > 0:
+                job.progress = downloaded / total
+                self.emit('progress', job=job, downloaded_bytes=downloaded, total_bytes=total,
+                          batch_progress=self.get_batch_progress(), speed=self.progress.speed,
+                          eta=self.get_eta())
+        elif d['status'] == 'finished':
+            self.set_job_state(job, JobState.POSTPROCESSING)
+            self.emit('file_downloaded', job=job, filename=d['filename'])
+            self.log(f"Downloaded: {d['filename']}")
+
+    def get_ydl_opts(self, job):
+        """Get the yt-dlp option profile of a job (without its output folder)"""
+        return build_ydl_opts(job.download_type, self.options, job.quality, job.audio_format)
+
+    def get_staging_dir(self, job, variant):
+        """Get the job's staging directory, the same one every time the job runs"""
+        if job.staging_dir is None:
+            # The journal ID survives a restart, so a resumed job finds its partial files
+            job_key = job.journal_id if job.journal_id is not None else f'run{job.job_id}'
+            key = get_staging_key(job.video_id, job.url, job.download_type, variant, job_key)
+            job.staging_dir = self.output.get_staging_dir(key)
+        return job.staging_dir
+
+    def get_variant(self, job):
+        """Get the quality or format that distinguishes this job in the archive"""
+        if job.download_type == 'video':
+            return (job.quality or self.options.video_quality).lower()
+        return (job.audio_format or self.options.audio_format).lower()
+
+    def skip_if_downloaded(self, job, variant):
+        """Mark a job skipped if the archive or this batch already covers it
+
+        A job for a video another job of the batch is already fetching
+        waits for that job, and downloads the video itself if it failed.
+        """
+        if not job.video_id:
+            return False
+        key = (job.video_id, job.download_type, variant)
+        with self._lock:
+            first = self._claimed.setdefault(key, job)
+        if first is not job and not first.finished:
+            self.log(f"⏳ Waiting for URL {first.url_index}, which fetches the same video: {job.url}")
+        with self._claims_changed:
+            while first is not job and first.state != JobState.DONE:
+                if job.cancelled:
+                    # Left for the caller's next check_cancelled
+                    return False
+                if first.finished:
+                    # The first job failed; this one tries instead
+                    first = self._claimed[key] = job
+                    break
+                self._claims_changed.wait(0.5)
+                first = self._claimed.setdefault(key, job)
+        if first is not job:
+            self.log(f"⏭️ Skipping {job.download_type} (same video as URL {first.url_index}): {job.url}")
+        elif self.archive is not None and self.archive.contains(*key):
+            self.log(f"⏭️ Skipping {job.download_type} (already downloaded): {job.title or job.url}")
+        else:
+            return False
+        job.skipped = True
+        return True
+
+    def finish_download(self, job, variant):
+        """Move a finished download out of staging and record it"""
+        if job.filename and is_staging_path(job.filename):
+            staging_dir = os.path.dirname(job.filename)
+            job.filename = self.output.finalize(job.filename)
+            self.output.discard(staging_dir)
+        if self.archive is not None and job.video_id:
+            self.archive.add(job.video_id, job.download_type, variant, job.filename, job.title)
+        self.log(f"✅ {job.download_type.title()} download completed!")
+        return True
+
+    def convert(self, job, variant, conversion, source=None):
+        """Convert a downloaded audio file on the post-processing pipeline
+
+        With ``source`` the audio is taken from that file, which is kept.
+        """
+        ext, args = conversion
+        try:
+            self.check_cancelled(job)
+            with self.profile():
+                job.filename = convert_audio(source or job.filename, ext, args,
+                                             self.postprocessor.ffmpeg,
+                                             keep_source=source is not None,
+                                             target_dir=self.get_staging_dir(job, variant))
+            return self.finish_download(job, variant)
+        except JobCancelled as e:
+            job.error = e
+            return False
+        except Exception as e:
+            job.error = e
+            self.log(f"❌ Error converting {job.title or job.url} to {variant.upper()}: {str(e)}")
+            return False
+
+    def derive_audio(self, video_job, job):
+        """Queue extraction of an audio job's file from its video job's download"""
+        variant = self.get_variant(job)
+        job.video_id = job.video_id or video_job.video_id
+        job.title = video_job.title
+        if self.skip_if_downloaded(job, variant):
+            return True
+        conversion = get_audio_conversion(variant, video_job.filename, video_job.acodec)
+        # Nothing to download; only the extraction is left
+        self.progress.set_expected(job, 0)
+        self.set_job_state(job, JobState.POSTPROCESSING)
+        self.log(f"🎛️ Extracting {variant.upper()} from the downloaded video: {job.title}")
+        return self.postprocessor.submit(self.convert, job, variant, conversion, video_job.filename)
+
+    def download(self, job):
+        """Download a single job using yt-dlp
+
+        Returns True or False, or a ``Future`` of the result when the file
+        still has to be converted on the post-processing pipeline.
+        """
+        url, download_type = job.url, job.download_type
+        try:
+            self.check_cancelled(job)
+
+            # Check the archive before paying for extraction
+            variant = self.get_variant(job)
+            job.video_id = job.video_id or canonical_video_id(url)
+            if self.skip_if_downloaded(job, variant):
+                return True
+
+            # Extracted once per URL and shared with the other download type
+            self.set_job_state(job, JobState.EXTRACTING)
+            info = self.metadata.get(url)
+            title = job.title = info.get('title', 'Unknown')
+            expected_size = estimate_download_size(info, download_type,
+                                                   job.quality or self.options.video_quality)
+            self.progress.set_expected(job, expected_size)
+            if not job.video_id and info.get('id'):
+                job.video_id = info['id']
+                if self.skip_if_downloaded(job, variant):
+                    return True
+            self.check_cancelled(job)
+            self.output.reserve(job.job_id, expected_size)
+            self.get_staging_dir(job, variant)
+
+            with self.sessions.borrow(self.get_ydl_opts(job),
+                                      progress_hook=lambda d: self.progress_hook(d, job),
+                                      paths={'home': job.staging_dir}) as ydl:
+                self.log(f"Starting {download_type} download: {title}")
+
+                # Select formats and download from the already extracted info
+                try:
+                    result = ydl.process_ie_result(info, download=True)
+                except yt_dlp.utils.DownloadError as e:
+                    # Cached stream URLs can be revoked before their expiry time
+                    if not (self.metadata.is_cached(url) and is_expired_stream_error(e)):
+                        raise
+                    self.log(f"🔄 Cached stream URLs expired, re-extracting: {title}")
+                    self.emit('retry', job=job, error=e, kind=TRANSIENT)
+                    result = ydl.process_ie_result(self.metadata.refresh(url), download=True)
+
+            requested = ((result or {}).get('requested_downloads') or [{}])[0]
+            job.filename = requested.get('filepath')
+            job.acodec = requested.get('acodec') or (result or {}).get('acodec')
+            if download_type == 'audio':
+                conversion = get_audio_conversion(variant, job.filename, job.acodec)
+                if conversion is not None:
+                    action = 'remux' if is_stream_copy(conversion[1]) else 'conversion'
+                    self.log(f"🎛️ Queued {variant.upper()} {action}: {title}")
+                    return self.postprocessor.submit(self.convert, job, variant, conversion)
+
+            return self.finish_download(job, variant)
+
+        except JobCancelled as e:
+            job.error = e
+            return False
+        except Exception as e:
+            job.error = e
+            self.log(f"❌ Error downloading {download_type}: {str(e)}")
+            return False
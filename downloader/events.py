@@ -0,0 +1,67 @@
+"""
+Thread-safe event queue for front ends that render engine events
+"""
+
+import logging
+import logging.handlers
+import os
+import threading
+from collections import deque
+
+from downloader.paths import get_data_dir
+
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class EventQueue:
+    """Collect engine events from worker threads for a UI thread to drain
+
+    Progress events are coalesced per job so only the latest one is kept,
+    however often the download threads report. Every other event is kept
+    in order.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._progress = {}
+
+    def post(self, event):
+        """Add an event; safe to call from any thread"""
+        with self._lock:
+            if event['type'] == 'progress':
+                job_id = event['job'].job_id
+                # Re-insert so the dict stays ordered by most recent update
+                self._progress.pop(job_id, None)
+                self._progress[job_id] = event
+            else:
+                self._events.append(event)
+
+    def drain(self):
+        """Take all pending events: the latest progress per job first, then the rest in order"""
+        with self._lock:
+            progress = list(self._progress.values())
+            events = list(self._events)
+            self._progress.clear()
+            self._events.clear()
+        return progress + events
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events) + len(self._progress)
+
+
+def open_log_file(name='downloader.log'):
+    """Get a logger that writes the full, unbounded log to a rotating file"""
+    log_dir = os.path.join(get_data_dir(), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    logger = logging.getLogger(f'downloader.{name}')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, name), maxBytes=LOG_FILE_MAX_BYTES,
+            backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+    return logger
@@ -0,0 +1,117 @@
+"""
+Shared metadata extraction so each URL is only extracted once per batch
+"""
+
+import copy
+import threading
+
+import yt_dlp
+
+from downloader.urls import canonical_video_id
+
+EXTRACT_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+}
+
+
+def copy_info(info):
+    """Return a copy of an info dict that yt-dlp is free to mutate"""
+    try:
+        return copy.deepcopy(info)
+    except Exception:
+        return dict(info)
+
+
+class MetadataStore:
+    """Extract metadata once per URL and share it between the jobs for that URL
+
+    Concurrent callers asking for the same URL wait for the first extraction
+    instead of starting their own. Every caller gets its own copy of the info
+    dict because ``process_ie_result`` mutates it while selecting formats.
+    When a ``MetadataCache`` is given, single-video URLs are looked up there
+    before extracting and stored there afterwards. With a ``SessionPool``
+    extractions borrow a pooled session instead of building their own.
+    """
+    def __init__(self, ydl_opts=None, cache=None, sessions=None):
+        self.ydl_opts = dict(EXTRACT_OPTS, **(ydl_opts or {}))
+        self.cache = cache
+        self.sessions = sessions
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, url):
+        """Get the unprocessed info dict for a URL, extracting it if needed"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                entry = self._entries[url] = _Entry()
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            try:
+                entry.info, entry.from_cache = self._load(url)
+            except Exception as e:
+                entry.error = e
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+
+        if entry.error is not None:
+            raise entry.error
+        return copy_info(entry.info)
+
+    def refresh(self, url):
+        """Re-extract a URL, bypassing the cache, e.g. after its stream URLs expired"""
+        video_id = canonical_video_id(url)
+        if self.cache is not None and video_id:
+            self.cache.invalidate(video_id)
+        self.release(url)
+        return self.get(url)
+
+    def is_cached(self, url):
+        """Check whether the info for a URL was served from the persistent cache"""
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry is not None and entry.from_cache
+
+    def _load(self, url):
+        video_id = canonical_video_id(url)
+        if self.cache is not None and video_id:
+            info = self.cache.get(video_id)
+            if info is not None:
+                return info, True
+
+        info = self.extract(url)
+        if self.cache is not None and video_id and info.get('_type', 'video') == 'video':
+            self.cache.put(video_id, info)
+        return info, False
+
+    def extract(self, url):
+        """Run the yt-dlp extractor without format selection or download"""
+        if self.sessions is not None:
+            with self.sessions.borrow(self.ydl_opts) as ydl:
+                return ydl.extract_info(url, download=False, process=False)
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False, process=False)
+
+    def release(self, url):
+        """Forget the info for a URL once all of its jobs are finished"""
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def clear(self):
+        """Forget all extracted info"""
+        with self._lock:
+            self._entries.clear()
+
+
+class _Entry:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.info = None
+        self.error = None
+        self.from_cache = False
@@ -0,0 +1,166 @@
+"""
+Crash-safe journal of batch jobs so an interrupted batch can be resumed
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from downloader.paths import get_data_path
+from downloader.scheduler import DownloadJob, JobState
+
+FINISHED_BATCH_RETENTION = 7 * 24 * 60 * 60
+
+
+class JobJournal:
+    """Write-ahead journal of every job in a batch, stored in SQLite
+
+    Each job's state is written before the work for that state starts, so
+    after a crash the journal shows which jobs were finished and which were
+    still queued or in flight. Jobs get a ``journal_id`` when first recorded.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_data_path('job_journal.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    options TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    finished_at REAL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    journal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    download_type TEXT NOT NULL,
+                    url_index INTEGER NOT NULL,
+                    quality TEXT,
+                    audio_format TEXT,
+                    parent_url TEXT,
+                    video_id TEXT,
+                    title TEXT,
+                    is_collection INTEGER NOT NULL DEFAULT 0,
+                    listed INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL,
+                    tmp_filename TEXT,
+                    filename TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+
+    def start_batch(self, options):
+        """Record a new batch and return its ID"""
+        batch_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            # Batches finished long ago are of no use for resuming
+            cutoff = time.time() - FINISHED_BATCH_RETENTION
+            self._conn.execute(
+                "DELETE FROM jobs WHERE batch_id IN (SELECT batch_id FROM batches WHERE finished_at < ?)",
+                (cutoff,))
+            self._conn.execute("DELETE FROM batches WHERE finished_at < ?", (cutoff,))
+            self._conn.execute("INSERT INTO batches VALUES (?, ?, ?, NULL)",
+                               (batch_id, json.dumps(options), time.time()))
+        return batch_id
+
+    def add_jobs(self, batch_id, jobs, is_collection=False):
+        """Record jobs that are about to be queued"""
+        now = time.time()
+        with self._lock, self._conn:
+            for job in jobs:
+                if job.journal_id is not None:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (batch_id, url, download_type, url_index, quality, audio_format,"
+                    " parent_url, video_id, title, is_collection, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (batch_id, job.url, job.download_type, job.url_index, job.quality,
+                     job.audio_format, job.parent_url, job.video_id, job.title,
+                     int(is_collection), job.state, now))
+                job.journal_id = cursor.lastrowid
+
+    def update_job(self, job, tmp_filename=None):
+        """Write a job's current state"""
+        if job.journal_id is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, video_id = ?, title = ?, filename = ?, error = ?,"
+                " tmp_filename = COALESCE(?, tmp_filename), updated_at = ? WHERE journal_id = ?",
+                (job.state, job.video_id, job.title, job.filename,
+                 str(job.error) if job.error is not None else None,
+                 tmp_filename, time.time(), job.journal_id))
+
+    def mark_listed(self, jobs):
+        """Record that a collection has been fully listed"""
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE jobs SET listed = 1 WHERE journal_id = ?",
+                                   [(job.journal_id,) for job in jobs
+                                    if job.journal_id is not None])
+
+    def finish_batch(self, batch_id):
+        """Mark a batch as finished so it is not offered for resuming"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE batches SET finished_at = ? WHERE batch_id = ?",
+                               (time.time(), batch_id))
+
+    def get_unfinished_batch(self):
+        """Get ``(batch_id, options, pending_count)`` of the latest unfinished batch, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT batch_id, options FROM batches WHERE finished_at IS NULL"
+                " ORDER BY created_at DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE batch_id = ? AND state NOT IN (?, ?) AND is_collection = 0",
+                (row[0], JobState.DONE, JobState.FAILED)).fetchone()[0]
+        return row[0], json.loads(row[1]), pending
+
+    def load_pending_jobs(self, batch_id):
+        """Rebuild the jobs of a batch that still have work to do
+
+        Finished jobs are left out. Collections whose listing completed are
+        left out too, since their videos are in the journal as jobs of their
+        own; collections that were still being listed are listed again.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT journal_id, url, download_type, url_index, quality, audio_format, parent_url,"
+                " video_id, title, is_collection, listed, state FROM jobs WHERE batch_id = ?"
+                " ORDER BY journal_id", (batch_id,)).fetchall()
+
+        jobs = []
+        for (journal_id, url, download_type, url_index, quality, audio_format, parent_url,
+             video_id, title, is_collection, listed, state) in rows:
+            if is_collection and listed:
+                continue
+            if not is_collection and state in JobState.FINISHED:
+                continue
+            job = DownloadJob(url, download_type, url_index, quality=quality,
+                              audio_format=audio_format, parent_url=parent_url)
+            job.journal_id = journal_id
+            job.video_id = video_id
+            job.title = title
+            jobs.append(job)
+        return jobs
+
+    def get_partial_files(self, batch_id):
+        """Get the temporary files of jobs that were interrupted mid-download"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tmp_filename FROM jobs WHERE batch_id = ? AND tmp_filename IS NOT NULL"
+                " AND state NOT IN (?, ?)", (batch_id, JobState.DONE, JobState.FAILED)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
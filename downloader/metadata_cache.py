@@ -0,0 +1,120 @@
+"""
+Persistent on-disk cache of extract_info results
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+from downloader.options import METADATA_CACHE_TTL
+from downloader.paths import get_data_path
+
+DEFAULT_MAX_ENTRIES = 5000
+# Treat stream URLs as expired a little early so a download doesn't start on a dying URL
+STREAM_EXPIRY_MARGIN = 10 * 60
+
+_PATH_EXPIRE_RE = re.compile(r'/expire/(\d+)')
+
+
+def get_stream_expiry(info):
+    """Get the earliest expiry timestamp of the stream URLs in an info dict, or None"""
+    expiries = []
+    for fmt in info.get('formats') or [info]:
+        url = fmt.get('url') or fmt.get('manifest_url')
+        if not url:
+            continue
+        expire = parse_qs(urlparse(url).query).get('expire', [None])[0]
+        if expire is None:
+            match = _PATH_EXPIRE_RE.search(url)
+            expire = match.group(1) if match else None
+        if expire and expire.isdigit():
+            expiries.append(int(expire))
+    return min(expiries) if expiries else None
+
+
+class MetadataCache:
+    """SQLite-backed cache of info dicts keyed by canonical video ID
+
+    Entries older than ``ttl`` seconds are dropped when the cache is opened
+    or looked up, and once more than ``max_entries`` are stored the least
+    recently used ones are evicted. ``get`` only returns entries whose
+    stream URLs are still valid.
+    """
+    def __init__(self, path=None, ttl=METADATA_CACHE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or get_data_path('metadata_cache.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    video_id TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    streams_expire_at REAL
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS metadata_last_access ON metadata (last_access)")
+        self.prune()
+
+    def get(self, video_id):
+        """Get a cached info dict that is still usable for downloading, or None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT info, fetched_at, streams_expire_at FROM metadata WHERE video_id = ?",
+                (video_id,)).fetchone()
+            if row is None:
+                return None
+            data, fetched_at, streams_expire_at = row
+            if fetched_at + self.ttl < now:
+                self._conn.execute("DELETE FROM metadata WHERE video_id = ?", (video_id,))
+                return None
+            if streams_expire_at is not None and streams_expire_at - STREAM_EXPIRY_MARGIN < now:
+                return None
+            self._conn.execute("UPDATE metadata SET last_access = ? WHERE video_id = ?", (now, video_id))
+        return json.loads(data)
+
+    def put(self, video_id, info):
+        """Store an info dict and evict the least recently used entries"""
+        data = json.dumps(yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                (video_id, data, now, now, get_stream_expiry(info)))
+            self._conn.execute("""
+                DELETE FROM metadata WHERE video_id IN (
+                    SELECT video_id FROM metadata ORDER BY last_access DESC
+                    LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def invalidate(self, video_id):
+        """Drop a cached entry"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM metadata WHERE video_id = ?", (video_id,))
+
+    def prune(self):
+        """Drop every entry older than the TTL"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM metadata WHERE fetched_at < ?", (time.time() - self.ttl,))
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM metadata")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
@@ -0,0 +1,203 @@
+"""
+Per-job timing spans and counters collected from engine events
+
+``MetricsCollector`` is fed every event the engine emits. For each job it
+records how long it spent in each phase (queued, extracting, downloading,
+post-processing), the bytes it transferred, its retries and, for failed
+jobs, the class and kind (see ``classify_error``) of the error. Finished
+jobs can be appended to a JSONL file and the totals written as a
+Prometheus textfile.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from downloader.concurrency import classify_error
+from downloader.scheduler import JobState
+
+
+def get_error_class(error):
+    """Get the class name of the error behind a (possibly wrapped) job error"""
+    if error is None:
+        return None
+    # yt-dlp wraps the original exception in DownloadError
+    exc_info = getattr(error, 'exc_info', None)
+    if exc_info and exc_info[1] is not None:
+        error = exc_info[1]
+    return type(error).__name__
+
+
+class _JobRecord:
+    def __init__(self, now):
+        self.phase = JobState.QUEUED
+        self.since = now
+        self.created_at = now
+        self.spans = defaultdict(float)
+        self.bytes = 0
+        self.last_downloaded = 0
+        self.retries = 0
+
+
+class MetricsCollector:
+    """Collect job metrics from engine events and export them
+
+    ``jsonl_path`` gets one line per finished job; ``prometheus_path`` is
+    rewritten (atomically) whenever a job or batch finishes.
+    """
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._records = {}
+
+        # Totals over every finished job, only touched while holding self._lock
+        self.jobs = Counter()
+        self.phase_seconds = defaultdict(float)
+        self.phase_count = Counter()
+        self.bytes_total = 0
+        self.retries = Counter()
+        self.errors = Counter()
+
+    def record(self, event):
+        """Update the metrics with an engine event"""
+        event_type = event['type']
+        if event_type == 'job_state':
+            self._enter(event['job'], event['job'].state)
+        elif event_type == 'progress':
+            self._add_bytes(event['job'], event['downloaded_bytes'])
+        elif event_type == 'retry':
+            with self._lock:
+                self._get_record(event['job']).retries += 1
+                self.retries[event.get('kind')] += 1
+        elif event_type == 'job_finished':
+            self._finish(event['job'])
+        elif event_type == 'batch_finished':
+            self.write_prometheus()
+
+    def _get_record(self, job, now=None):
+        record = self._records.get(job.job_id)
+        if record is None:
+            record = self._records[job.job_id] = _JobRecord(now or time.time())
+        return record
+
+    def _enter(self, job, phase):
+        now = time.time()
+        with self._lock:
+            record = self._get_record(job, now)
+            if phase == record.phase:
+                return
+            record.spans[record.phase] += now - record.since
+            record.phase = phase
+            record.since = now
+
+    def _add_bytes(self, job, downloaded):
+        with self._lock:
+            record = self._get_record(job)
+            # A new stream of the same job restarts its byte count
+            if downloaded >= record.last_downloaded:
+                record.bytes += downloaded - record.last_downloaded
+            else:
+                record.bytes += downloaded
+            record.last_downloaded = downloaded
+
+    def _finish(self, job):
+        now = time.time()
+        with self._lock:
+            record = self._records.pop(job.job_id, None) or _JobRecord(now)
+            record.spans[record.phase] += now - record.since
+            error_class = get_error_class(job.error) if job.state == JobState.FAILED else None
+
+            self.jobs[(job.download_type, job.state)] += 1
+            for phase, seconds in record.spans.items():
+                self.phase_seconds[phase] += seconds
+                self.phase_count[phase] += 1
+            self.bytes_total += record.bytes
+            if error_class:
+                self.errors[error_class] += 1
+
+        downloading = record.spans.get(JobState.DOWNLOADING, 0.0)
+        entry = {
+            'job_id': job.job_id,
+            'url': job.url,
+            'type': job.download_type,
+            'video_id': job.video_id,
+            'state': job.state,
+            'skipped': job.skipped,
+            'created_at': record.created_at,
+            'finished_at': now,
+            'spans': dict(record.spans),
+            'bytes': record.bytes,
+            'bytes_per_second': record.bytes / downloading if downloading > 0 else None,
+            'retries': record.retries,
+            'error_class': error_class,
+            'error_kind': classify_error(job.error) if error_class else None,
+            'error': str(job.error) if error_class else None,
+        }
+        if self.jsonl_path:
+            self.append_jsonl(entry)
+        self.write_prometheus()
+        return entry
+
+    def phase_means(self):
+        """Get the mean seconds per finished job spent in each phase"""
+        with self._lock:
+            jobs = sum(self.jobs.values())
+            return {phase: seconds / jobs for phase, seconds in self.phase_seconds.items()} if jobs else {}
+
+    def append_jsonl(self, entry):
+        line = json.dumps(entry)
+        with self._lock:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+    def format_prometheus(self):
+        """Get the totals in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP ytdl_jobs_total Finished download jobs by type and final state',
+                '# TYPE ytdl_jobs_total counter',
+            ]
+            for (download_type, state), count in sorted(self.jobs.items()):
+                lines.append(f'ytdl_jobs_total{{type="{download_type}",state="{state}"}} {count}')
+            lines += [
+                '# HELP ytdl_phase_seconds Time finished jobs spent in each phase',
+                '# TYPE ytdl_phase_seconds summary',
+            ]
+            for phase in sorted(self.phase_seconds):
+                lines.append(f'ytdl_phase_seconds_sum{{phase="{phase}"}} {self.phase_seconds[phase]:.6f}')
+                lines.append(f'ytdl_phase_seconds_count{{phase="{phase}"}} {self.phase_count[phase]}')
+            lines += [
+                '# HELP ytdl_downloaded_bytes_total Bytes downloaded by finished jobs',
+                '# TYPE ytdl_downloaded_bytes_total counter',
+                f'ytdl_downloaded_bytes_total {self.bytes_total}',
+                '# HELP ytdl_retries_total Download retries by error kind',
+                '# TYPE ytdl_retries_total counter',
+            ]
+            for kind, count in sorted(self.retries.items(), key=lambda item: str(item[0])):
+                lines.append(f'ytdl_retries_total{{kind="{kind or "unknown"}"}} {count}')
+            lines += [
+                '# HELP ytdl_errors_total Failed jobs by error class',
+                '# TYPE ytdl_errors_total counter',
+            ]
+            for error_class, count in sorted(self.errors.items()):
+                lines.append(f'ytdl_errors_total{{error_class="{error_class}"}} {count}')
+            downloading = self.phase_seconds.get(JobState.DOWNLOADING, 0.0)
+            lines += [
+                '# HELP ytdl_download_throughput_bytes Bytes per second of download time',
+                '# TYPE ytdl_download_throughput_bytes gauge',
+                f'ytdl_download_throughput_bytes {self.bytes_total / downloading if downloading else 0:.1f}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self):
+        """Rewrite the textfile for the node exporter's textfile collector"""
+        if not self.prometheus_path:
+            return
+        text = self.format_prometheus()
+        tmp_path = f'{self.prometheus_path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.prometheus_path)
@@ -0,0 +1,63 @@
+"""
+Batch options and the choices offered for them
+
+Kept free of yt-dlp imports so front ends can build their widgets before
+the download engine has loaded.
+"""
+
+import os
+
+from downloader.output import MIN_FREE_SPACE
+
+VIDEO_QUALITIES = ["720p", "1080p", "1440p", "2160p"]
+AUDIO_FORMATS = ["MP3", "M4A", "WAV", "OPUS", "AAC"]
+DOWNLOAD_TYPES = ('video', 'audio')
+# Seconds extracted video info stays in the on-disk metadata cache
+METADATA_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+class DownloadOptions:
+    """Settings shared by every job in a batch"""
+    def __init__(self, download_folder=None, video_quality="1080p", audio_format="MP3",
+                 max_workers=3, quiet=False, use_archive=True, use_journal=True,
+                 range_connections=0, rate_limit=0, derive_audio=True, adaptive_concurrency=True,
+                 max_workers_limit=8, max_retries=3, preallocate=False,
+                 min_free_space=MIN_FREE_SPACE, session_max_uses=50, sync=False,
+                 metadata_ttl=METADATA_CACHE_TTL):
+        self.download_folder = download_folder or os.path.join(os.path.expanduser("~"), "Downloads")
+        self.video_quality = video_quality
+        self.audio_format = audio_format
+        self.max_workers = max_workers
+        self.quiet = quiet
+        self.use_archive = use_archive
+        self.use_journal = use_journal
+        # Connections per file for the range downloader; 0 uses yt-dlp's downloader
+        self.range_connections = range_connections
+        # Total bandwidth of all workers in bytes per second; 0 is unlimited
+        self.rate_limit = rate_limit
+        # Make audio from the downloaded video when a URL wants both
+        self.derive_audio = derive_audio
+        # Lower parallel downloads on throttling and raise them (up to
+        # max_workers_limit) while throughput keeps improving
+        self.adaptive_concurrency = adaptive_concurrency
+        self.max_workers_limit = max_workers_limit
+        # Retries of a job after a throttling or transient error
+        self.max_retries = max_retries
+        # Reserve disk space for large files up front; with range_connections
+        # at 0 this sends them through the range downloader on one connection
+        self.preallocate = preallocate
+        # Bytes to leave free on the download disk; jobs that would not fit fail
+        self.min_free_space = min_free_space
+        # Jobs a pooled YoutubeDL session serves before it is replaced
+        self.session_max_uses = session_max_uses
+        # Only queue channel and playlist videos that earlier syncs did not list
+        self.sync = sync
+        # Seconds cached video info is reused; 0 always extracts again
+        self.metadata_ttl = metadata_ttl
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
@@ -0,0 +1,149 @@
+"""
+Staging, free-space checks and atomic finalizing for the download folder
+
+Each job downloads (and converts) inside its own staging directory under
+``<folder>/.ytdl-staging``, named after the video, download type, variant
+and the job itself, so an interrupted job finds its partial files again
+and no two jobs ever share one. The staging area sits in the download
+folder, so it is on the same filesystem and the finished file can be moved
+out with a rename. A file never replaces one that is already there: two
+videos with the same title end up as ``Title.mp4`` and ``Title (2).mp4``.
+"""
+
+import errno
+import hashlib
+import os
+import re
+import shutil
+import threading
+
+from downloader.progress import format_bytes
+
+STAGING_DIR_NAME = '.ytdl-staging'
+# Space left free for everything else on the disk
+MIN_FREE_SPACE = 512 * 1024 * 1024
+# yt-dlp's initial read/write block size (it grows from here as needed)
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Files at least this big are preallocated (see RangeDownloader)
+PREALLOCATE_MIN_SIZE = 4 * 1024 * 1024
+
+UNSAFE_KEY_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+LINK_UNSUPPORTED_ERRORS = (errno.EPERM, errno.EACCES, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV,
+                           errno.EMLINK)
+
+
+class InsufficientSpaceError(OSError):
+    """The download folder does not have room for a download"""
+
+
+def get_free_space(folder):
+    """Get the free bytes on the filesystem a folder is (or will be) on"""
+    path = os.path.abspath(folder)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def get_staging_key(video_id, url, download_type, variant, job_key):
+    """Get the staging directory name of a job; the same job always gets the same one
+
+    ``job_key`` tells apart jobs for the same video and variant, so a job
+    never writes into a directory another job is about to discard.
+    """
+    source = video_id or hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    return UNSAFE_KEY_RE.sub('_', f'{source}-{download_type}-{variant}-{job_key}')
+
+
+def is_staging_path(path):
+    """Check whether a file lives in a staging directory"""
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(path)))) == STAGING_DIR_NAME
+
+
+def move_no_clobber(source, target):
+    """Move a file to ``target`` atomically, failing with FileExistsError if it exists"""
+    try:
+        # A hard link never replaces an existing file
+        os.link(source, target)
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRORS:
+            raise
+        # No hard links here (e.g. FAT or some network shares); rename
+        # refuses existing targets on Windows and races only briefly elsewhere
+        if os.path.exists(target):
+            raise FileExistsError(errno.EEXIST, "File exists", target)
+        os.rename(source, target)
+        return
+    os.remove(source)
+
+
+class OutputFolder:
+    """The download folder, its staging area and the space reserved in it
+
+    ``reserve`` accounts for the expected size of every running download,
+    so parallel jobs do not each assume they have the whole free space.
+    """
+    def __init__(self, folder, min_free_space=MIN_FREE_SPACE):
+        self.folder = folder
+        self.min_free_space = min_free_space
+        self.staging_root = os.path.join(folder, STAGING_DIR_NAME)
+        self._lock = threading.Lock()
+        self._reserved = {}
+
+    def get_staging_dir(self, key):
+        """Get (and create) the staging directory for a staging key"""
+        path = os.path.join(self.staging_root, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def check_free_space(self, size=0):
+        """Raise ``InsufficientSpaceError`` unless ``size`` more bytes fit; returns the free bytes"""
+        free = get_free_space(self.folder)
+        with self._lock:
+            reserved = sum(self._reserved.values())
+        if free - reserved - size < self.min_free_space:
+            raise InsufficientSpaceError(
+                f"Not enough disk space in {self.folder}: {format_bytes(free)} free, "
+                f"{format_bytes(reserved + size)} needed by downloads and "
+                f"{format_bytes(self.min_free_space)} kept free")
+        return free
+
+    def reserve(self, key, size):
+        """Reserve space for a download, raising ``InsufficientSpaceError`` if it does not fit
+
+        A download of unknown ``size`` only needs the minimum free space.
+        """
+        with self._lock:
+            self._reserved.pop(key, None)
+        self.check_free_space(size or 0)
+        if size:
+            with self._lock:
+                self._reserved[key] = size
+
+    def release(self, key):
+        with self._lock:
+            self._reserved.pop(key, None)
+
+    def finalize(self, path):
+        """Move a finished file into the download folder under a free name; returns the new path"""
+        os.makedirs(self.folder, exist_ok=True)
+        stem, ext = os.path.splitext(os.path.basename(path))
+        target = os.path.join(self.folder, stem + ext)
+        number = 2
+        while True:
+            try:
+                move_no_clobber(path, target)
+                return target
+            except FileExistsError:
+                target = os.path.join(self.folder, f"{stem} ({number}){ext}")
+                number += 1
+
+    def discard(self, staging_dir):
+        """Delete a staging directory and the staging root once it is empty"""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        try:
+            os.rmdir(self.staging_root)
+        except OSError:
+            pass
@@ -0,0 +1,19 @@
+"""
+Locations of the downloader's local state (caches, indexes, logs)
+"""
+
+import os
+
+DATA_DIR_ENV = 'YTDL_DATA_DIR'
+
+
+def get_data_dir():
+    """Get the directory used for local state, creating it if needed"""
+    data_dir = os.environ.get(DATA_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".youtube_downloader")
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+def get_data_path(name):
+    """Get the path of a file inside the data directory"""
+    return os.path.join(get_data_dir(), name)
@@ -0,0 +1,103 @@
+"""
+Lazy expansion of playlist and channel URLs into individual video URLs
+"""
+
+import re
+
+import yt_dlp
+
+from downloader.urls import YOUTUBE_HOST_RE
+
+# Accepts the same hosts as ``YOUTUBE_URL_RE``, so every accepted playlist is expanded
+COLLECTION_URL_RE = re.compile(
+    YOUTUBE_HOST_RE + r'(?:playlist\?(?:.*&)?list=|channel/|c/|user/|@)[\w.-]+')
+PLAYLIST_URL_RE = re.compile(YOUTUBE_HOST_RE + r'playlist\?')
+
+FLAT_EXTRACT_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    # Only list the entries; each video is extracted later by its own job
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+}
+
+# Nested listings (e.g. the Videos/Shorts/Live tabs of a channel) are followed this deep
+MAX_NESTING = 3
+
+
+def is_collection_url(url):
+    """Check whether a URL lists many videos (playlist, channel or user page)"""
+    return bool(COLLECTION_URL_RE.match(url.strip()))
+
+
+def is_playlist_url(url):
+    """Check whether a URL is a playlist, whose order is up to its owner (channels list newest first)"""
+    return bool(PLAYLIST_URL_RE.match(url.strip()))
+
+
+def iter_entries(url, ydl_opts=None, stop_at=None, _depth=0):
+    """Yield one flat entry dict per video of a playlist or channel
+
+    Listing pages are fetched as the generator is consumed, so the first
+    entries are available long before the whole listing has been walked.
+    Every yielded entry has at least ``id`` and ``url``.
+
+    ``stop_at(entry)`` is asked about every video before it is yielded; once
+    it returns True the listing that video is in stops there and no further
+    pages of it are fetched. Nested listings (channel tabs) stop one by one.
+    """
+    opts = dict(FLAT_EXTRACT_OPTS, **(ydl_opts or {}))
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        result = ydl.extract_info(url, download=False, process=False)
+        yield from _iter_result(result, opts, stop_at, _depth)
+
+
+def _iter_result(result, opts, stop_at, depth):
+    result_type = result.get('_type', 'video')
+    if result_type in ('url', 'url_transparent'):
+        if depth < MAX_NESTING and _is_nested_listing(result):
+            yield from iter_entries(result['url'], opts, stop_at, depth + 1)
+        else:
+            entry = _to_entry(result)
+            if entry:
+                yield entry
+    elif result_type in ('playlist', 'multi_video'):
+        for entry in result.get('entries') or []:
+            if not entry:
+                continue
+            video = _to_entry(entry) if stop_at is not None and _is_video(entry) else None
+            if video is not None and stop_at(video):
+                break
+            yield from _iter_result(entry, opts, stop_at, depth)
+    else:
+        entry = _to_entry(result)
+        if entry:
+            yield entry
+
+
+def _is_video(result):
+    result_type = result.get('_type', 'video')
+    if result_type in ('url', 'url_transparent'):
+        return not _is_nested_listing(result)
+    return result_type not in ('playlist', 'multi_video')
+
+
+def _is_nested_listing(result):
+    return result.get('ie_key') == 'YoutubeTab' or is_collection_url(result.get('url') or '')
+
+
+def _to_entry(result):
+    video_id = result.get('id')
+    url = result.get('url') or result.get('webpage_url')
+    if video_id and not (url or '').startswith('http'):
+        url = f'https://www.youtube.com/watch?v={video_id}'
+    if not url:
+        return None
+    return {
+        'id': video_id,
+        'url': url,
+        'title': result.get('title'),
+        'duration': result.get('duration'),
+        'upload_date': result.get('upload_date'),
+        'timestamp': result.get('timestamp'),
+    }
@@ -0,0 +1,149 @@
+"""
+Post-processing stage that runs audio conversions off the download workers
+
+yt-dlp runs FFmpegExtractAudio inline, so a download worker sits idle while
+ffmpeg transcodes and ffmpeg sits idle while the worker downloads. The
+pipeline takes finished files from the workers instead and converts them on
+its own pool, one ffmpeg process per CPU, while the workers move on to the
+next download.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Per audio format: output extension, source codecs that can be stream-copied
+# into it, the ffmpeg arguments used when the audio has to be re-encoded, and
+# the muxer arguments added either way
+AUDIO_TARGETS = {
+    'mp3': ('mp3', ('mp3',), ['-acodec', 'libmp3lame', '-b:a', '192k'], []),
+    'wav': ('wav', (), ['-f', 'wav'], []),
+    'aac': ('aac', ('mp4a', 'aac'), ['-acodec', 'aac', '-b:a', '192k'], ['-f', 'adts']),
+    'm4a': ('m4a', ('mp4a', 'aac'), ['-acodec', 'aac', '-b:a', '192k'], []),
+    'opus': ('opus', ('opus',), ['-acodec', 'libopus', '-b:a', '128k'], []),
+}
+
+# yt-dlp format selectors that prefer a stream in a codec we can copy
+AUDIO_FORMAT_SELECTORS = {
+    'mp3': 'bestaudio[acodec=mp3]/bestaudio',
+    'wav': 'bestaudio',
+    'aac': 'bestaudio[acodec^=mp4a]/bestaudio[ext=m4a]/bestaudio',
+    'm4a': 'bestaudio[acodec^=mp4a]/bestaudio[ext=m4a]/bestaudio',
+    'opus': 'bestaudio[acodec=opus]/bestaudio',
+}
+
+COPY_ARGS = ['-acodec', 'copy']
+
+
+class PostProcessError(Exception):
+    """ffmpeg could not convert a downloaded file"""
+
+
+def find_ffmpeg():
+    """Get the path of the ffmpeg binary, or None if it is not installed"""
+    return shutil.which('ffmpeg')
+
+
+def is_stream_copy(args):
+    """Check whether ffmpeg arguments from ``get_audio_conversion`` only remux"""
+    return args[:len(COPY_ARGS)] == COPY_ARGS
+
+
+def get_codec_name(acodec):
+    """Normalize a yt-dlp ``acodec`` such as ``mp4a.40.2`` to ``mp4a``"""
+    if not acodec or acodec == 'none':
+        return None
+    return acodec.split('.')[0].lower()
+
+
+def get_audio_conversion(audio_format, filename, acodec=None):
+    """Get the (ext, ffmpeg args) needed to turn ``filename`` into ``audio_format``
+
+    A source whose codec ``acodec`` already matches the target is only
+    remuxed (stream copy); anything else is re-encoded. When the codec is
+    unknown the extension decides. Returns None if the file is already in
+    the requested format.
+    """
+    target = AUDIO_TARGETS.get(audio_format)
+    if target is None or not filename:
+        return None
+    ext, copy_codecs, encode_args, mux_args = target
+    source_ext = os.path.splitext(filename)[1][1:].lower()
+    codec = get_codec_name(acodec)
+
+    if codec is None:
+        return None if source_ext == ext else (ext, encode_args + mux_args)
+    if codec in copy_codecs:
+        return None if source_ext == ext else (ext, COPY_ARGS + mux_args)
+    return (ext, encode_args + mux_args)
+
+
+def build_ffmpeg_command(ffmpeg, source, target, args):
+    """Get the ffmpeg command line that writes the audio of ``source`` to ``target``"""
+    return [ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-i', source, '-vn', *args, target]
+
+
+def convert_audio(source, ext, args, ffmpeg=None, keep_source=False, target_dir=None):
+    """Convert ``source`` to a sibling file with extension ``ext``
+
+    With ``target_dir`` the new file goes there instead of next to ``source``.
+
+    The output is written to a temporary name and renamed once ffmpeg
+    succeeds, so an interrupted conversion never leaves a truncated file
+    behind. The source is deleted afterwards unless ``keep_source`` is set.
+    Returns the new path.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        raise PostProcessError("ffmpeg not found; install it to convert audio")
+
+    stem = os.path.splitext(source)[0]
+    if target_dir:
+        stem = os.path.join(target_dir, os.path.basename(stem))
+    target = stem + '.' + ext
+    tmp_target = stem + '.temp.' + ext
+    command = build_ffmpeg_command(ffmpeg, source, tmp_target, args)
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        try:
+            os.remove(tmp_target)
+        except OSError:
+            pass
+        message = process.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise PostProcessError(message[-1] if message else f"ffmpeg exited with {process.returncode}")
+
+    os.replace(tmp_target, target)
+    if not keep_source and os.path.abspath(source) != os.path.abspath(target):
+        os.remove(source)
+    return target
+
+
+class PostProcessPipeline:
+    """Pool of ffmpeg conversions fed by the download workers
+
+    Each task spends its time waiting on an ffmpeg child process, so a thread
+    per CPU keeps every core busy without the start-up cost (or the frozen
+    executable quirks) of a ``ProcessPoolExecutor``.
+    """
+    def __init__(self, max_workers=None, ffmpeg=None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """Run ``func(*args)`` on the pool; returns a ``Future``"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='postprocess')
+            return self._executor.submit(func, *args)
+
+    def shutdown(self, wait=True):
+        """Stop the pool threads; the pool restarts on the next submit"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
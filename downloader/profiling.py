@@ -0,0 +1,77 @@
+"""
+Opt-in cProfile hook for the engine's hot paths
+
+cProfile only sees the thread it was enabled on, so ``Profiler`` keeps one
+profile per thread and merges them when the stats are dumped. From Python
+3.12 only one profiler can be active in the process at a time; sections
+that start while another thread is profiling run unprofiled (counted in
+``skipped``) instead of failing. Profiling is off unless a ``Profiler`` is
+passed to the engine (``--profile`` on the command line, ``YTDL_PROFILE``
+for the app).
+"""
+
+import contextlib
+import cProfile
+import pstats
+import threading
+
+
+class Profiler:
+    """Profile code run inside ``section`` on any thread"""
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+        # Sections that ran unprofiled because another profiler was active
+        self.skipped = 0
+
+    @contextlib.contextmanager
+    def section(self):
+        local = self._local
+        profile = getattr(local, 'profile', None)
+        if profile is None:
+            profile = local.profile = cProfile.Profile()
+            local.depth = 0
+            with self._lock:
+                self._profiles.append(profile)
+
+        # Nested sections are already covered by the outer one
+        local.depth += 1
+        if local.depth == 1:
+            try:
+                profile.enable()
+                local.active = True
+            except ValueError:
+                # "Another profiling tool is already active" (Python 3.12+)
+                local.active = False
+                with self._lock:
+                    self.skipped += 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if local.depth == 0 and local.active:
+                profile.disable()
+
+    def get_stats(self):
+        """Get the merged stats of every thread, or None if nothing was profiled"""
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = None
+        for profile in profiles:
+            # A profile without any calls cannot be loaded into Stats
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue
+        return stats
+
+    def dump(self, path):
+        """Write the merged stats to ``path`` for ``pstats`` or snakeviz"""
+        stats = self.get_stats()
+        if stats is not None:
+            stats.dump_stats(path)
+        return stats
@@ -0,0 +1,197 @@
+"""
+Byte-weighted batch progress, smoothed throughput and ETA
+
+Every job is weighted by the bytes it is expected to download: the
+``filesize``/``filesize_approx`` of its format from the extracted metadata,
+replaced by the real size once the download reports it. Jobs that have not
+been extracted yet count as the average of the known sizes. The ETA adds
+the post-processing time that past runs took per job type and format.
+"""
+
+import json
+import os
+import threading
+import time
+
+from downloader.paths import get_data_path
+
+# Weight of the newest sample in the smoothed throughput
+SPEED_SMOOTHING = 0.3
+# Minimum seconds between throughput samples
+SPEED_SAMPLE_INTERVAL = 0.5
+
+
+def get_format_size(fmt):
+    return fmt.get('filesize') or fmt.get('filesize_approx')
+
+
+def estimate_download_size(info, download_type, quality=None):
+    """Guess how many bytes a job will download from its unprocessed info dict
+
+    Mirrors the format selection of ``build_ydl_opts`` closely enough for a
+    progress estimate; returns None if no format has a size.
+    """
+    formats = [f for f in (info.get('formats') or [info]) if get_format_size(f)]
+    if download_type == 'video':
+        max_height = int(str(quality or '1080p').lower().rstrip('p'))
+        candidates = [f for f in formats
+                      if f.get('vcodec') != 'none' and f.get('acodec') != 'none'
+                      and (f.get('height') or 0) <= max_height]
+        key = lambda f: (f.get('height') or 0, get_format_size(f))
+    else:
+        candidates = [f for f in formats if f.get('vcodec') == 'none'] or formats
+        key = lambda f: (f.get('abr') or 0, get_format_size(f))
+    if not candidates:
+        return None
+    return get_format_size(max(candidates, key=key))
+
+
+def format_bytes(count):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if count < 1024 or unit == 'GiB':
+            return f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class PostProcessHistory:
+    """Average post-processing seconds per job, by job type and format, kept between runs"""
+    def __init__(self, path=None):
+        self.path = path or get_data_path('postprocess_history.json')
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.seconds = {key: float(value) for key, value in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            self.seconds = {}
+
+    def get(self, key):
+        with self._lock:
+            return self.seconds.get(key)
+
+    def record(self, key, seconds):
+        """Fold a new measurement into the running average"""
+        with self._lock:
+            previous = self.seconds.get(key)
+            self.seconds[key] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.seconds)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+class BatchProgress:
+    """Track bytes across all concurrent jobs of a batch
+
+    ``postprocess_workers`` is how many conversions run at once, used to
+    spread the remaining post-processing time in the ETA.
+    """
+    def __init__(self, history=None, postprocess_workers=1):
+        self.history = history
+        self.postprocess_workers = max(1, postprocess_workers)
+        self._lock = threading.Lock()
+        self._expected = {}
+        self._downloaded = {}
+        self._postprocess_started = {}
+
+        self._speed = None
+        self._sample_time = time.monotonic()
+        self._sample_bytes = 0
+
+    def set_expected(self, job, size):
+        """Set the estimated download size of a job (None if unknown)"""
+        if size is None:
+            return
+        with self._lock:
+            self._expected.setdefault(job.job_id, size)
+
+    def add_bytes(self, job, delta, downloaded, total):
+        """Record ``delta`` new bytes; ``downloaded``/``total`` are the current stream's counts"""
+        now = time.monotonic()
+        with self._lock:
+            done = self._downloaded.get(job.job_id, 0) + delta
+            self._downloaded[job.job_id] = done
+            if total:
+                # Earlier streams of the job plus the real size of this one
+                self._expected[job.job_id] = done - downloaded + total
+
+            self._sample_bytes += delta
+            elapsed = now - self._sample_time
+            if elapsed >= SPEED_SAMPLE_INTERVAL:
+                speed = self._sample_bytes / elapsed
+                if self._speed is None:
+                    self._speed = speed
+                else:
+                    self._speed = SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * self._speed
+                self._sample_time = now
+                self._sample_bytes = 0
+
+    def start_postprocessing(self, job):
+        with self._lock:
+            self._postprocess_started.setdefault(job.job_id, time.monotonic())
+
+    def finish(self, job, key):
+        """Record how long a finished job spent post-processing under ``key``"""
+        with self._lock:
+            started = self._postprocess_started.pop(job.job_id, None)
+        if started is not None and self.history is not None and not job.skipped and job.error is None:
+            self.history.record(key, time.monotonic() - started)
+
+    @property
+    def speed(self):
+        """Smoothed download throughput in bytes per second, or None before the first sample"""
+        with self._lock:
+            return self._speed
+
+    def _get_sizes(self, jobs):
+        known = [self._expected[job.job_id] for job in jobs if job.job_id in self._expected]
+        default = sum(known) / len(known) if known else 0
+        return [(job, self._expected.get(job.job_id, default)) for job in jobs]
+
+    def get_percent(self, jobs):
+        """Get overall progress as a percentage of the expected bytes"""
+        with self._lock:
+            sizes = self._get_sizes(jobs)
+            total = done = 0
+            for job, size in sizes:
+                total += size
+                done += size if job.finished else min(self._downloaded.get(job.job_id, 0), size)
+        if not total:
+            # Nothing has a size yet: fall back to counting jobs
+            return sum(1.0 if job.finished else job.progress for job in jobs) / len(jobs) * 100 if jobs else 0
+        return done / total * 100
+
+    def get_eta(self, jobs, get_key):
+        """Estimate the seconds until every job is downloaded and post-processed
+
+        ``get_key`` maps a job to its post-processing history key. Returns
+        None until there is a throughput sample.
+        """
+        with self._lock:
+            speed = self._speed
+            if not speed:
+                return None
+            remaining = 0
+            for job, size in self._get_sizes(jobs):
+                if not job.finished:
+                    remaining += max(0, size - self._downloaded.get(job.job_id, 0))
+            unfinished = [job for job in jobs if not job.finished]
+
+        postprocessing = 0.0
+        if self.history is not None:
+            for job in unfinished:
+                postprocessing += self.history.get(get_key(job)) or 0.0
+        # Conversions overlap with downloads, so this errs on the long side
+        return remaining / speed + postprocessing / self.postprocess_workers
@@ -0,0 +1,369 @@
+"""
+Multi-connection HTTP range downloader for large single files
+
+A file is split into fixed-size byte ranges that a pool of worker threads
+fetch over their own keep-alive connections and write straight into a
+preallocated file at the right offsets. A failed range is retried on its
+own without touching the rest of the file, and the finished ranges are
+recorded next to the file so an interrupted download can be resumed.
+"""
+
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+import yt_dlp
+from yt_dlp.downloader.common import FileDownloader
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Files smaller than this are not worth splitting
+DEFAULT_MIN_SIZE = 16 * 1024 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+MAX_REDIRECTS = 5
+
+
+class RangeNotSupported(Exception):
+    """The server does not support byte range requests for this URL"""
+
+
+class RangeDownloadError(Exception):
+    """A byte range could not be downloaded after all retries"""
+
+
+class RangeHTTPError(RangeDownloadError):
+    """The server answered a range request with an error status
+
+    The message reads like yt-dlp's ``HTTP Error <status>: <reason>`` so
+    errors are classified the same whichever downloader hit them.
+    """
+    def __init__(self, status, start, end):
+        self.status = status
+        reason = http.client.responses.get(status, 'Unknown')
+        super().__init__(f"HTTP Error {status}: {reason} (bytes {start}-{end})")
+
+
+def preallocate(fileobj, size):
+    """Reserve ``size`` bytes for a file so ranges can be written at any offset"""
+    fileobj.truncate(size)
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fileobj.fileno(), 0, size)
+        except OSError:
+            pass
+
+
+class _Connection:
+    """A keep-alive HTTP(S) connection to one host"""
+    def __init__(self, url, timeout):
+        parsed = urlparse(url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.conn = connection_class(parsed.hostname, parsed.port, timeout=timeout)
+
+    def request(self, method, url, headers):
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        self.conn.request(method, path, headers=headers)
+        return self.conn.getresponse()
+
+    def close(self):
+        self.conn.close()
+
+
+class RangeDownloader:
+    """Download one URL into ``filename`` over several parallel range requests
+
+    ``progress`` is called as ``progress(downloaded_bytes, total_bytes)`` from
+    the worker threads with a count that never goes down: the bytes of a
+    range that is retried are counted again only once the retry gets past
+    them. ``throttle`` (if given) is called with the size of every block
+    read before it is written, and may block to limit bandwidth.
+    """
+    def __init__(self, url, filename, headers=None, connections=DEFAULT_CONNECTIONS,
+                 chunk_size=DEFAULT_CHUNK_SIZE, retries=5, timeout=30, progress=None, throttle=None):
+        self.url = url
+        self.filename = filename
+        self.headers = dict(headers or {})
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.progress = progress
+        self.throttle = throttle
+
+        self.total_bytes = None
+        self.downloaded_bytes = 0
+        self.reported_bytes = 0
+        self.chunk_retries = 0
+        self._lock = threading.Lock()
+        self._report_lock = threading.Lock()
+        self._done_chunks = set()
+        self._errors = []
+
+    @property
+    def state_filename(self):
+        return self.filename + '.chunks'
+
+    def probe(self):
+        """Find the file size and final URL, raising RangeNotSupported if ranges don't work"""
+        url = self.url
+        for _ in range(MAX_REDIRECTS + 1):
+            conn = _Connection(url, self.timeout)
+            try:
+                response = conn.request('GET', url, dict(self.headers, Range='bytes=0-0'))
+                response.read()
+            finally:
+                conn.close()
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 206:
+                raise RangeNotSupported(f"HTTP {response.status} for a range request")
+            content_range = response.getheader('Content-Range') or ''
+            total = content_range.rpartition('/')[2]
+            if not total.isdigit():
+                raise RangeNotSupported(f"Unknown file size in Content-Range {content_range!r}")
+            self.url = url
+            self.total_bytes = int(total)
+            return self.total_bytes
+        raise RangeNotSupported("Too many redirects")
+
+    def download(self):
+        """Download the whole file; returns the number of bytes"""
+        if self.total_bytes is None:
+            self.probe()
+        total = self.total_bytes
+        chunks = [(start, min(start + self.chunk_size, total) - 1)
+                  for start in range(0, total, self.chunk_size)]
+
+        self._load_state(len(chunks))
+        mode = 'r+b' if os.path.exists(self.filename) and self._done_chunks else 'w+b'
+        with open(self.filename, mode) as f:
+            if mode == 'w+b':
+                preallocate(f, total)
+
+        pending = [i for i in range(len(chunks)) if i not in self._done_chunks]
+        self.downloaded_bytes = sum(chunks[i][1] - chunks[i][0] + 1 for i in self._done_chunks)
+        self._report()
+
+        queue_lock = threading.Lock()
+
+        def next_chunk():
+            with queue_lock:
+                return pending.pop(0) if pending and not self._errors else None
+
+        workers = [threading.Thread(target=self._worker, args=(chunks, next_chunk),
+                                    name=f"range-worker-{i + 1}")
+                   for i in range(min(self.connections, len(pending)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if self._errors:
+            raise self._errors[0]
+        try:
+            os.remove(self.state_filename)
+        except OSError:
+            pass
+        return total
+
+    def _worker(self, chunks, next_chunk):
+        conn = None
+        with open(self.filename, 'r+b') as f:
+            while True:
+                index = next_chunk()
+                if index is None:
+                    break
+                start, end = chunks[index]
+                try:
+                    conn = self._fetch_with_retries(conn, f, start, end)
+                except (RangeDownloadError, yt_dlp.utils.DownloadCancelled) as e:
+                    with self._lock:
+                        self._errors.append(e)
+                    break
+                with self._lock:
+                    self._done_chunks.add(index)
+                    self._save_state()
+        if conn is not None:
+            conn.close()
+
+    def _fetch_with_retries(self, conn, f, start, end):
+        """Fetch one range, reconnecting and retrying only that range on errors"""
+        for attempt in range(self.retries + 1):
+            try:
+                if conn is None:
+                    conn = _Connection(self.url, self.timeout)
+                self._fetch(conn, f, start, end)
+                return conn
+            except yt_dlp.utils.DownloadCancelled:
+                # A progress hook asked to stop; retrying would only fight it
+                if conn is not None:
+                    conn.close()
+                raise
+            except Exception as e:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                if isinstance(e, RangeHTTPError) and 400 <= e.status < 500 and e.status != 408:
+                    # Refused, throttled or expired; the caller decides whether to try again
+                    raise
+                if attempt == self.retries:
+                    raise RangeDownloadError(f"Range download failed: bytes {start}-{end} "
+                                             f"after {self.retries} retries: {e}")
+                with self._lock:
+                    self.chunk_retries += 1
+                time.sleep(min(2 ** attempt, 10))
+
+    def _fetch(self, conn, f, start, end):
+        """Fetch one range into the file at its offset"""
+        response = conn.request('GET', self.url, dict(self.headers, Range=f'bytes={start}-{end}'))
+        if response.status != 206:
+            response.read()
+            raise RangeHTTPError(response.status, start, end)
+
+        f.seek(start)
+        expected = end - start + 1
+        written = 0
+        try:
+            while written < expected:
+                block = response.read(min(READ_BLOCK_SIZE, expected - written))
+                if not block:
+                    raise RangeDownloadError(f"Connection closed at byte {start + written}")
+                if self.throttle:
+                    self.throttle(len(block))
+                f.write(block)
+                written += len(block)
+                self._add_bytes(len(block))
+        except Exception:
+            # Let the caller roll back the progress of the partial range
+            self._add_bytes(-written)
+            raise
+        f.flush()
+
+    def _add_bytes(self, count):
+        if not count:
+            return
+        # Counts are reported in order, one at a time, and never below an earlier one
+        with self._report_lock:
+            with self._lock:
+                self.downloaded_bytes += count
+                if self.downloaded_bytes <= self.reported_bytes:
+                    return
+                self.reported_bytes = self.downloaded_bytes
+            self._call_progress()
+
+    def _report(self):
+        with self._report_lock:
+            with self._lock:
+                self.reported_bytes = max(self.reported_bytes, self.downloaded_bytes)
+            self._call_progress()
+
+    def _call_progress(self):
+        if self.progress:
+            self.progress(self.reported_bytes, self.total_bytes)
+
+    def _load_state(self, chunk_count):
+        self._done_chunks = set()
+        try:
+            with open(self.state_filename) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('total_bytes') == self.total_bytes and state.get('chunk_size') == self.chunk_size:
+            self._done_chunks = {i for i in state.get('done', []) if 0 <= i < chunk_count}
+
+    def _save_state(self):
+        tmp = self.state_filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'total_bytes': self.total_bytes, 'chunk_size': self.chunk_size,
+                       'done': sorted(self._done_chunks)}, f)
+        os.replace(tmp, self.state_filename)
+
+
+class RangeFD(FileDownloader):
+    """yt-dlp file downloader that fetches plain HTTP formats with RangeDownloader"""
+    FD_NAME = 'ranges'
+
+    def real_download(self, filename, info_dict):
+        tmpfilename = self.temp_name(filename)
+        started = time.time()
+
+        def progress(downloaded, total):
+            elapsed = time.time() - started
+            speed = downloaded / elapsed if elapsed > 0 else None
+            self._hook_progress({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'filename': filename,
+                'tmpfilename': tmpfilename,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (total - downloaded) / speed if speed else None,
+            }, info_dict)
+
+        options = self.params.get('range_download') or {}
+        retries = self.params.get('retries')
+        downloader = RangeDownloader(info_dict['url'], tmpfilename,
+                                     headers=info_dict.get('http_headers'),
+                                     connections=options.get('connections', DEFAULT_CONNECTIONS),
+                                     chunk_size=options.get('chunk_size', DEFAULT_CHUNK_SIZE),
+                                     retries=retries if isinstance(retries, int) else 10,
+                                     progress=progress, throttle=options.get('throttle'))
+        downloader.probe()
+        self.report_destination(filename)
+        total = downloader.download()
+
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'elapsed': time.time() - started,
+        }, info_dict)
+        return True
+
+
+def can_use_ranges(info, params):
+    """Check whether a selected format should go through the range downloader"""
+    options = params.get('range_download') or {}
+    if not options.get('connections'):
+        return False
+    if info.get('protocol') not in ('http', 'https') or info.get('requested_formats'):
+        return False
+    size = info.get('filesize') or info.get('filesize_approx') or 0
+    return size >= options.get('min_size', DEFAULT_MIN_SIZE)
+
+
+class RangeYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that sends large plain HTTP downloads through RangeFD
+
+    Enabled by the ``range_download`` option, a dict with ``connections``,
+    ``chunk_size``, ``min_size`` and an optional ``throttle`` callable.
+    Anything else, or a server without range support, uses yt-dlp's own
+    downloaders.
+    """
+    def dl(self, name, info, subtitle=False, test=False):
+        if subtitle or test or name == '-' or not can_use_ranges(info, self.params):
+            return super().dl(name, info, subtitle=subtitle, test=test)
+
+        fd = RangeFD(self, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        try:
+            return fd.download(name, new_info, subtitle)
+        except RangeNotSupported as e:
+            self.write_debug(f'Range downloads unavailable ({e}); using the default downloader')
+            return super().dl(name, info, subtitle=subtitle, test=test)
@@ -0,0 +1,65 @@
+"""
+Process-wide bandwidth limiting for download workers
+"""
+
+import threading
+import time
+
+# Longest single sleep, so a rate change at runtime takes effect quickly
+MAX_WAIT = 0.25
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every download worker
+
+    ``rate`` is in bytes per second; 0 means unlimited. ``consume`` may run
+    the bucket into debt for a large block, and callers then wait until the
+    debt is paid back, so the long-run throughput of all callers together
+    stays at ``rate`` while bursts up to ``burst`` bytes pass straight through.
+    """
+    def __init__(self, rate=0, burst=None):
+        self._lock = threading.Lock()
+        self.rate = 0
+        self.burst = 0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """Change the limit; takes effect for workers that are already waiting"""
+        with self._lock:
+            self._refill()
+            self.rate = max(0, rate or 0)
+            # Allow about a quarter second of traffic as a burst by default
+            self.burst = burst if burst is not None else max(self.rate / 4, 64 * 1024)
+            self._tokens = min(self._tokens, self.burst)
+
+    def consume(self, amount):
+        """Take ``amount`` bytes worth of tokens, blocking while the bucket is in debt"""
+        if amount <= 0:
+            return
+        with self._lock:
+            if not self.rate:
+                return
+            self._refill()
+            self._tokens -= amount
+
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                self._refill()
+                if self._tokens >= 0:
+                    return
+                wait = min(-self._tokens / self.rate, MAX_WAIT)
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+# Shared by every engine in the process unless one is given its own limiter
+global_limiter = TokenBucket()
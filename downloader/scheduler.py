@@ -0,0 +1,376 @@
+"""
+Bounded worker-pool scheduler for batch downloads
+"""
+
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+_job_ids = itertools.count(1)
+
+
+class JobState:
+    """Lifecycle states of a download job"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    EXTRACTING = 'extracting'
+    DOWNLOADING = 'downloading'
+    POSTPROCESSING = 'postprocessing'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    FINISHED = (DONE, FAILED)
+
+
+class DownloadJob:
+    """A single URL/format unit of work
+
+    ``quality`` and ``audio_format`` override the batch-wide options for this
+    job when set. Jobs created from a playlist or channel listing keep its URL
+    in ``parent_url``. Queued jobs with a higher ``priority`` start first.
+    ``derived_jobs`` are jobs whose output is made from this job's download
+    instead of being downloaded separately. ``cancelled`` is set when the
+    job was asked to stop. Its files are written to ``staging_dir`` until
+    they are finished.
+    """
+    def __init__(self, url, download_type, url_index=0, quality=None, audio_format=None,
+                 parent_url=None, priority=0):
+        self.job_id = next(_job_ids)
+        self.url = url
+        self.download_type = download_type
+        self.url_index = url_index
+        self.quality = quality
+        self.audio_format = audio_format
+        self.parent_url = parent_url
+        self.priority = priority
+        self.video_id = None
+        self.journal_id = None
+        self.derived_jobs = []
+        self.state = JobState.QUEUED
+        self.progress = 0.0
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.title = None
+        self.filename = None
+        self.staging_dir = None
+        self.acodec = None
+        self.skipped = False
+        self.cancelled = False
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.state in JobState.FINISHED
+
+    def to_dict(self):
+        """Get a JSON-serializable summary of the job"""
+        return {
+            'job_id': self.job_id,
+            'url': self.url,
+            'type': self.download_type,
+            'url_index': self.url_index,
+            'quality': self.quality,
+            'audio_format': self.audio_format,
+            'parent_url': self.parent_url,
+            'priority': self.priority,
+            'state': self.state,
+            'progress': self.progress,
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'video_id': self.video_id,
+            'title': self.title,
+            'filename': self.filename,
+            'skipped': self.skipped,
+            'cancelled': self.cancelled,
+            'error': str(self.error) if self.error is not None else None,
+        }
+
+    def __repr__(self):
+        return f"DownloadJob({self.job_id}, {self.download_type!r}, {self.url!r}, {self.state})"
+
+
+class JobQueue:
+    """Thread-safe priority queue of jobs that can be reordered while in use
+
+    Jobs are ordered by descending ``priority`` and then by submission order.
+    Changing a queued job's priority re-inserts it; the stale heap entry is
+    skipped when it reaches the top.
+    """
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, job):
+        with self._cond:
+            self._push(job)
+            self._cond.notify()
+
+    def get(self):
+        """Take the highest priority job, or None once the queue is closed and empty"""
+        with self._cond:
+            while True:
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    job = entry[2]
+                    if job is not None:
+                        del self._entries[job.job_id]
+                        return job
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def set_priority(self, job_id, priority):
+        """Change the priority of a queued job; returns False if it is not queued"""
+        with self._cond:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return False
+            job = entry[2]
+            entry[2] = None
+            job.priority = priority
+            self._push(job)
+            return True
+
+    def remove(self, job_id):
+        """Take a job out of the queue; returns it, or None if it is not queued"""
+        with self._cond:
+            entry = self._entries.pop(job_id, None)
+            if entry is None:
+                return None
+            job = entry[2]
+            entry[2] = None
+            return job
+
+    def top_priority(self):
+        with self._cond:
+            return max((entry[2].priority for entry in self._entries.values()), default=0)
+
+    def queued_jobs(self):
+        """Get the queued jobs in the order they will run"""
+        with self._cond:
+            return [entry[2] for entry in sorted(self._entries.values())]
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def _push(self, job):
+        entry = [-job.priority, next(self._counter), job]
+        self._entries[job.job_id] = entry
+        heapq.heappush(self._heap, entry)
+
+
+class BatchScheduler:
+    """Run download jobs on a bounded pool of worker threads
+
+    ``worker`` is called with each job and returns True on success, or a
+    ``Future`` of that result when the job finishes off the worker thread
+    (e.g. in the post-processing pipeline); the worker then moves straight
+    on to the next queued job. Jobs can be submitted while the pool is
+    running; call ``close`` once no more jobs will arrive and ``join`` to
+    wait for the queue to drain. Queued jobs run in priority order and can
+    be reprioritized at any time without affecting the ones already running.
+
+    ``set_max_workers`` changes how many jobs run at once while the pool is
+    running. Lowering it lets running jobs finish; their workers then wait
+    until a slot is free again.
+    """
+
+    def __init__(self, worker, max_workers=3, on_job_done=None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.worker = worker
+        self.max_workers = max_workers
+        self.on_job_done = on_job_done
+
+        self._queue = JobQueue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Workers holding a slot (running a job or waiting for one)
+        self._active = 0
+        self._slots = threading.Condition(self._lock)
+        # Jobs handed off as futures that have not resolved yet
+        self._pending = 0
+        self._pending_done = threading.Condition(self._lock)
+
+        # Shared counters, only touched while holding self._lock
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker threads"""
+        with self._lock:
+            self._start_threads()
+
+    def set_max_workers(self, max_workers):
+        """Change how many jobs may run at once"""
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        with self._lock:
+            self.max_workers = max_workers
+            self._slots.notify_all()
+            if self._threads:
+                self._start_threads()
+
+    def _start_threads(self):
+        for i in range(len(self._threads), self.max_workers):
+            thread = threading.Thread(target=self._worker_loop,
+                                      name=f"download-worker-{i + 1}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job):
+        """Queue a job for download"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit jobs to a closed scheduler")
+            self.submitted += 1
+        self._queue.put(job)
+        self.start()
+        return job
+
+    def close(self):
+        """Signal that no more jobs will be submitted"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.close()
+
+    def join(self):
+        """Wait for all submitted jobs to finish"""
+        # Raising max_workers can add threads while we wait
+        while True:
+            with self._lock:
+                threads = [thread for thread in self._threads if thread.is_alive()]
+            if not threads:
+                break
+            for thread in threads:
+                thread.join()
+        with self._pending_done:
+            while self._pending:
+                self._pending_done.wait()
+
+    def complete(self, job, result):
+        """Finish a job that ran outside the queue
+
+        ``result`` is what the worker would have returned for it.
+        """
+        with self._lock:
+            self.submitted += 1
+        self._complete(job, result)
+
+    def run(self, jobs):
+        """Run a fixed list of jobs to completion"""
+        for job in jobs:
+            self.submit(job)
+        self.close()
+        self.start()
+        self.join()
+        return jobs
+
+    def set_priority(self, job_id, priority):
+        """Change the priority of a queued job"""
+        return self._queue.set_priority(job_id, priority)
+
+    def cancel(self, job_id, error=None):
+        """Drop a queued job and finish it, and the jobs derived from it, as failed with ``error``
+
+        Returns False if the job is not queued (it may be running already).
+        """
+        job = self._queue.remove(job_id)
+        if job is None:
+            return False
+        job.error = error
+        self._finish_job(job, False)
+        for derived_job in job.derived_jobs:
+            # Nothing runs them without their job
+            derived_job.cancelled = True
+            derived_job.error = error
+            self.complete(derived_job, False)
+        return True
+
+    def move_to_front(self, job_id):
+        """Make a queued job the next one to start"""
+        return self._queue.set_priority(job_id, self._queue.top_priority() + 1)
+
+    def queued_jobs(self):
+        return self._queue.queued_jobs()
+
+    @property
+    def finished_count(self):
+        with self._lock:
+            return self.completed + self.failed
+
+    def _worker_loop(self):
+        while True:
+            with self._slots:
+                while self._active >= self.max_workers:
+                    self._slots.wait()
+                self._active += 1
+            try:
+                job = self._queue.get()
+                if job is None:
+                    return
+                self._run_job(job)
+            finally:
+                with self._slots:
+                    self._active -= 1
+                    self._slots.notify()
+
+    def _run_job(self, job):
+        job.state = JobState.RUNNING
+        try:
+            success = self.worker(job)
+        except Exception as e:
+            job.error = e
+            success = False
+        self._complete(job, success)
+
+    def _complete(self, job, result):
+        if isinstance(result, Future):
+            with self._lock:
+                self._pending += 1
+            result.add_done_callback(lambda future: self._finish_deferred_job(job, future))
+        else:
+            self._finish_job(job, result)
+
+    def _finish_deferred_job(self, job, future):
+        try:
+            success = future.result()
+        except Exception as e:
+            job.error = e
+            success = False
+        try:
+            self._finish_job(job, success)
+        finally:
+            with self._pending_done:
+                self._pending -= 1
+                self._pending_done.notify_all()
+
+    def _finish_job(self, job, success):
+        with self._lock:
+            if success:
+                job.state = JobState.DONE
+                self.completed += 1
+            else:
+                job.state = JobState.FAILED
+                self.failed += 1
+
+        if self.on_job_done:
+            try:
+                self.on_job_done(job)
+            except Exception:
+                pass
@@ -0,0 +1,522 @@
+"""
+Local HTTP/JSON service in front of the download engine
+
+    python -m downloader --serve --port 8765
+
+Endpoints (all bodies are JSON):
+
+- ``POST /batches``: submit a batch, ``{"urls": [...], "video": true,
+  "audio": false, "options": {"video_quality": "720p"}}`` and/or
+  ``{"jobs": [{"url": ..., "type": "audio", "audio_format": "opus"}]}``
+- ``GET /batches``: summaries of every batch
+- ``GET /batches/<id>``: a batch with all of its jobs
+- ``DELETE /batches/<id>``: cancel a batch
+- ``GET /batches/<id>/events``: stream the batch's events as server-sent
+  events (honours ``Last-Event-ID``)
+- ``GET /batches/<id>/poll?since=<seq>&timeout=<s>``: long-poll for the
+  events after ``since``
+
+Reconnecting clients get the latest progress of each running job and the
+last ``EVENT_HISTORY`` other events; when older events after their cursor
+were dropped, the poll answer has ``truncated`` set and the event stream
+starts with a ``history_truncated`` event.
+- ``GET /jobs/<id>``, ``DELETE /jobs/<id>``: a job's status, or cancel it
+- ``GET /health``
+
+Requests are served on an asyncio loop; batches run one after another on
+a runner thread, each on its own ``DownloadEngine`` and worker pool, and
+only hand events back to the loop.
+"""
+
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from downloader.engine import BatchResult, DownloadEngine, JobCancelled
+from downloader.options import AUDIO_FORMATS, DOWNLOAD_TYPES, VIDEO_QUALITIES, DownloadOptions
+from downloader.scheduler import DownloadJob, JobState
+
+# Events kept per batch for long-poll and SSE clients that reconnect; progress
+# events are kept apart, only the latest one of each running job
+EVENT_HISTORY = 1000
+MAX_BODY_SIZE = 10 * 1024 * 1024
+MAX_POLL_TIMEOUT = 60.0
+SSE_KEEPALIVE = 15.0
+
+REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+_batch_ids = itertools.count(1)
+
+
+class RequestError(Exception):
+    """An error reported to the client with an HTTP status"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json(value):
+    """Make engine event values JSON-serializable"""
+    if isinstance(value, DownloadJob):
+        return value.to_dict()
+    if isinstance(value, BatchResult):
+        return {
+            'success_count': value.success_count,
+            'skipped_count': value.skipped_count,
+            'completed_urls': value.completed_urls,
+            'failed_urls': value.failed_urls,
+            'cancelled': value.cancelled,
+        }
+    if isinstance(value, BaseException):
+        return str(value)
+    return value
+
+
+def check_choice(name, value, choices):
+    """Raise a 400 unless ``value`` is None or one of ``choices`` (any case)"""
+    if value is None:
+        return
+    if not isinstance(value, str) or value.lower() not in (choice.lower() for choice in choices):
+        raise RequestError(400, f"invalid {name} {value!r}; expected one of {', '.join(choices)}")
+
+
+def check_option(name, value, default):
+    """Raise a 400 unless an option override has the type of its default"""
+    if isinstance(default, bool):
+        valid = isinstance(value, bool)
+    elif isinstance(default, (int, float)):
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+    else:
+        valid = isinstance(value, type(default))
+    if not valid:
+        raise RequestError(400, f"invalid value {value!r} for option {name!r}")
+
+
+def get_list(spec, key):
+    value = spec.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise RequestError(400, f"'{key}' must be a list")
+    return value
+
+
+def parse_job_entry(entry, download_types):
+    """Check one job object; returns its (url, download types, priority)"""
+    if (not isinstance(entry, dict) or not isinstance(entry.get('url'), str)
+            or not entry['url'].strip()):
+        raise RequestError(400, f"invalid job {entry!r}")
+    check_choice('quality', entry.get('quality'), VIDEO_QUALITIES)
+    check_choice('audio_format', entry.get('audio_format'), AUDIO_FORMATS)
+    types = [entry['type']] if entry.get('type') else download_types
+    for download_type in types:
+        if download_type not in DOWNLOAD_TYPES:
+            raise RequestError(400, f"unknown download type {download_type!r}")
+    try:
+        priority = int(entry.get('priority', 0))
+    except (TypeError, ValueError):
+        raise RequestError(400, f"invalid priority in {entry!r}")
+    return entry['url'].strip(), types, priority
+
+
+def parse_jobs(spec, defaults):
+    """Build the options and jobs of a submitted batch"""
+    if not isinstance(spec, dict):
+        raise RequestError(400, "expected a JSON object")
+
+    overrides = spec.get('options') or {}
+    if not isinstance(overrides, dict):
+        raise RequestError(400, "'options' must be an object")
+    default_values = defaults.to_dict()
+    unknown = sorted(set(overrides) - set(default_values))
+    if unknown:
+        raise RequestError(400, f"unknown options: {', '.join(unknown)}")
+    for name, value in overrides.items():
+        check_option(name, value, default_values[name])
+    check_choice('video_quality', overrides.get('video_quality'), VIDEO_QUALITIES)
+    check_choice('audio_format', overrides.get('audio_format'), AUDIO_FORMATS)
+    options = DownloadOptions.from_dict({**default_values, **overrides})
+
+    jobs = []
+    url_indexes = {}
+    download_types = [t for t in DOWNLOAD_TYPES if spec.get(t, t == 'video')]
+    entries = [{'url': url} for url in get_list(spec, 'urls')] + get_list(spec, 'jobs')
+    for entry in entries:
+        url, types, priority = parse_job_entry(entry, download_types)
+        url_index = url_indexes.setdefault(url, len(url_indexes) + 1)
+        for download_type in types:
+            jobs.append(DownloadJob(url, download_type, url_index,
+                                    quality=entry.get('quality'),
+                                    audio_format=entry.get('audio_format'),
+                                    priority=priority))
+    if not jobs:
+        raise RequestError(400, "no jobs: give 'urls' or 'jobs'")
+    return options, jobs
+
+
+class Batch:
+    """A submitted batch and the events it has emitted so far"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, options, jobs):
+        self.batch_id = str(next(_batch_ids))
+        self.options = options
+        self.jobs = jobs
+        self.state = Batch.QUEUED
+        self.engine = None
+        self.result = None
+        self.submitted_at = time.time()
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.progress = {}
+        # Sequence number of the newest event pushed out of the history
+        self.dropped_seq = 0
+        self.next_seq = 1
+        # Replaced after every event; waiters hold on to the old one
+        self.changed = asyncio.Event()
+
+    @property
+    def done(self):
+        return self.state in (Batch.FINISHED, Batch.CANCELLED)
+
+    def get_jobs(self):
+        """Get the submitted jobs followed by the videos listed from playlists and channels"""
+        if self.engine is None:
+            return list(self.jobs)
+        submitted = {job.job_id for job in self.jobs}
+        return self.jobs + [job for job in list(self.engine.jobs) if job.job_id not in submitted]
+
+    def add_event(self, data):
+        """Keep an event for replay; a job's progress replaces its previous progress"""
+        if data['type'] == 'progress':
+            job_id = data['job']['job_id']
+            # Re-insert so the dict stays ordered by sequence number
+            self.progress.pop(job_id, None)
+            self.progress[job_id] = data
+            return
+        if data['type'] == 'job_finished':
+            self.progress.pop(data['job']['job_id'], None)
+        if len(self.events) == self.events.maxlen:
+            self.dropped_seq = self.events[0]['seq']
+        self.events.append(data)
+
+    def events_after(self, seq):
+        events = [event for event in self.events if event['seq'] > seq]
+        progress = [event for event in self.progress.values() if event['seq'] > seq]
+        return sorted(events + progress, key=lambda event: event['seq']) if progress else events
+
+    def is_truncated(self, seq):
+        """Check whether events after ``seq`` were pushed out of the history"""
+        return seq < self.dropped_seq
+
+    def summary(self):
+        jobs = self.get_jobs()
+        states = {}
+        for job in jobs:
+            states[job.state] = states.get(job.state, 0) + 1
+        summary = {
+            'batch_id': self.batch_id,
+            'state': self.state,
+            'submitted_at': self.submitted_at,
+            'jobs': len(jobs),
+            'job_states': states,
+            'result': to_json(self.result),
+        }
+        if self.engine is not None and self.state == Batch.RUNNING:
+            summary['progress'] = self.engine.get_batch_progress()
+            summary['eta'] = self.engine.get_eta()
+        return summary
+
+    def to_dict(self):
+        return dict(self.summary(), options=self.options.to_dict(),
+                    job_list=[job.to_dict() for job in self.get_jobs()])
+
+
+class DownloadService:
+    """Accept batches over HTTP and run them on download engines
+
+    ``create_engine(options, listener)`` builds the engine for a batch;
+    it defaults to a plain ``DownloadEngine``. ``defaults`` are the options
+    a batch starts from before its own ``options`` are applied.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, defaults=None, create_engine=None):
+        self.host = host
+        self.port = port
+        self.defaults = defaults or DownloadOptions()
+        self.create_engine = create_engine or (
+            lambda options, listener: DownloadEngine(options, listener=listener))
+        self.batches = {}
+        self._job_batches = {}
+        self._queue = queue.Queue()
+        self._runner = None
+        self._loop = None
+        self._server = None
+
+    async def start(self):
+        """Start listening; returns once the socket is bound"""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        # Port 0 picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._runner = threading.Thread(target=self._run_batches, name="service-runner")
+        self._runner.daemon = True
+        self._runner.start()
+        return self
+
+    async def stop(self):
+        """Stop accepting requests and cancel the running batch"""
+        for batch in self.batches.values():
+            if not batch.done:
+                self.cancel_batch(batch)
+        self._queue.put(None)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # Batches
+
+    def submit(self, options, jobs):
+        batch = Batch(options, jobs)
+        self.batches[batch.batch_id] = batch
+        for job in jobs:
+            self._job_batches[job.job_id] = batch
+        self._queue.put(batch)
+        return batch
+
+    def cancel_batch(self, batch):
+        """Cancel a batch; returns False if it already finished"""
+        if batch.state == Batch.QUEUED:
+            batch.state = Batch.CANCELLED
+            for job in batch.jobs:
+                self._cancel_queued_job(job)
+            self._post(batch, {'type': 'batch_cancelled'})
+        elif batch.state == Batch.RUNNING:
+            batch.engine.cancel_batch()
+        else:
+            return False
+        return True
+
+    def cancel_job(self, batch, job):
+        """Cancel one job; returns False if it already finished"""
+        if batch.engine is not None and batch.engine.cancel_job(job.job_id):
+            return True
+        if job.finished or job.cancelled:
+            return False
+        if batch.state == Batch.QUEUED:
+            self._cancel_queued_job(job)
+        else:
+            # Not registered with the engine yet; it stops before downloading
+            job.cancelled = True
+        return True
+
+    def _cancel_queued_job(self, job):
+        job.cancelled = True
+        job.error = JobCancelled()
+        job.state = JobState.FAILED
+
+    def _run_batches(self):
+        """Run submitted batches one at a time on the runner thread"""
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if batch.state != Batch.QUEUED:
+                continue
+            jobs = [job for job in batch.jobs if not job.cancelled]
+            try:
+                batch.engine = self.create_engine(batch.options,
+                                                  lambda event, batch=batch: self._post(batch, event))
+                batch.state = Batch.RUNNING
+                batch.engine.run_batch(jobs)
+            except Exception as e:
+                self._post(batch, {'type': 'batch_error', 'error': e})
+
+    def _post(self, batch, event):
+        """Hand an event from any thread to the loop"""
+        self._loop.call_soon_threadsafe(self._publish, batch, event)
+
+    def _publish(self, batch, event):
+        """Record an event on the loop thread and wake everyone waiting for one"""
+        event_type = event['type']
+        if event_type == 'job_state':
+            self._job_batches.setdefault(event['job'].job_id, batch)
+        elif event_type == 'batch_finished':
+            batch.result = event['result']
+            batch.state = Batch.CANCELLED if batch.result.cancelled else Batch.FINISHED
+        elif event_type == 'batch_error':
+            batch.state = Batch.FINISHED
+        data = {key: to_json(value) for key, value in event.items()}
+        data['seq'] = batch.next_seq
+        batch.next_seq += 1
+        batch.add_event(data)
+        changed, batch.changed = batch.changed, asyncio.Event()
+        changed.set()
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            method, target, headers, body = await self.read_request(reader)
+            await self.dispatch(method, target, headers, body, writer)
+        except RequestError as e:
+            await self.send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await self.send_json(writer, 500, {'error': str(e)})
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        try:
+            method, target, _version = request_line.split(' ', 2)
+        except ValueError:
+            raise RequestError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def dispatch(self, method, target, headers, body, writer):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        def get_number(value, convert=int):
+            try:
+                return convert(value)
+            except ValueError:
+                raise RequestError(400, f"invalid number {value!r}")
+
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['health'] and method == 'GET':
+            return await self.send_json(writer, 200, {'status': 'ok', 'batches': len(self.batches)})
+
+        if parts == ['batches']:
+            if method == 'GET':
+                return await self.send_json(writer, 200, [batch.summary() for batch in self.batches.values()])
+            if method == 'POST':
+                try:
+                    spec = json.loads(body or b'{}')
+                except ValueError as e:
+                    raise RequestError(400, f"invalid JSON: {e}")
+                batch = self.submit(*parse_jobs(spec, self.defaults))
+                return await self.send_json(writer, 201, batch.to_dict())
+            raise RequestError(405, f"{method} not allowed on /batches")
+
+        if len(parts) >= 2 and parts[0] == 'batches':
+            batch = self.batches.get(parts[1])
+            if batch is None:
+                raise RequestError(404, f"no batch {parts[1]}")
+            if len(parts) == 2 and method == 'GET':
+                return await self.send_json(writer, 200, batch.to_dict())
+            if len(parts) == 2 and method == 'DELETE':
+                if not await self._loop.run_in_executor(None, self.cancel_batch, batch):
+                    raise RequestError(409, f"batch {batch.batch_id} already finished")
+                return await self.send_json(writer, 202, batch.summary())
+            if parts[2:] == ['events'] and method == 'GET':
+                since = get_number(headers.get('last-event-id') or query.get('since') or 0)
+                return await self.stream_events(writer, batch, since)
+            if parts[2:] == ['poll'] and method == 'GET':
+                timeout = min(get_number(query.get('timeout', 30), float), MAX_POLL_TIMEOUT)
+                return await self.poll_events(writer, batch, get_number(query.get('since', 0)), timeout)
+
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job_id = int(parts[1]) if parts[1].isdigit() else None
+            batch = self._job_batches.get(job_id)
+            job = next((j for j in batch.get_jobs() if j.job_id == job_id), None) if batch else None
+            if job is None:
+                raise RequestError(404, f"no job {parts[1]}")
+            if method == 'GET':
+                return await self.send_json(writer, 200, dict(job.to_dict(), batch_id=batch.batch_id))
+            if method == 'DELETE':
+                if not await self._loop.run_in_executor(None, self.cancel_job, batch, job):
+                    raise RequestError(409, f"job {job_id} already finished")
+                return await self.send_json(writer, 202, job.to_dict())
+
+        raise RequestError(404, f"no route for {method} {url.path}")
+
+    async def poll_events(self, writer, batch, since, timeout):
+        """Answer with the events after ``since``, waiting up to ``timeout`` for one
+
+        ``truncated`` is set when some of those events are no longer kept.
+        """
+        truncated = batch.is_truncated(since)
+        events = batch.events_after(since)
+        if not events and not batch.done:
+            try:
+                await asyncio.wait_for(batch.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            events = batch.events_after(since)
+        next_seq = events[-1]['seq'] if events else since
+        await self.send_json(writer, 200, {'events': events, 'next': next_seq, 'state': batch.state,
+                                           'truncated': truncated})
+
+    async def stream_events(self, writer, batch, since):
+        """Send the batch's events as server-sent events until it is done
+
+        A ``history_truncated`` event comes first when some of the events
+        after ``since`` are no longer kept.
+        """
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+        if batch.is_truncated(since):
+            data = json.dumps({'since': since, 'dropped_seq': batch.dropped_seq})
+            writer.write(f"event: history_truncated\ndata: {data}\n\n".encode())
+        while True:
+            changed = batch.changed
+            for event in batch.events_after(since):
+                since = event['seq']
+                writer.write(f"id: {since}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+            await writer.drain()
+            if batch.done and not batch.events_after(since):
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                writer.write(b': keepalive\n\n')
+
+    async def send_json(self, writer, status, data):
+        body = json.dumps(data).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+def serve(host='127.0.0.1', port=8765, defaults=None, create_engine=None):
+    """Run the service until interrupted"""
+    service = DownloadService(host, port, defaults, create_engine)
+
+    async def main():
+        await service.start()
+        print(f"🌐 Listening on http://{service.host}:{service.port}", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,99 @@
+"""
+Pool of long-lived YoutubeDL sessions shared by the workers
+
+Building a ``YoutubeDL`` loads its extractors, cookie jar and HTTP handlers,
+and a fresh one starts without the YouTube player cache or open
+connections. Workers borrow a session for one extraction or download and
+hand it back, so the next job with the same options picks it up warm.
+"""
+
+import contextlib
+import json
+import threading
+
+from downloader.range_download import RangeYoutubeDL
+
+# A session is closed and replaced after this many borrows
+DEFAULT_MAX_USES = 50
+
+
+def get_profile_key(ydl_opts):
+    """Get the key of an option profile; equal options share sessions"""
+    return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+
+class ProgressDispatcher:
+    """The progress hook of a pooled session, forwarding to the current borrower's hook"""
+    def __init__(self):
+        self.hook = None
+
+    def __call__(self, d):
+        hook = self.hook
+        if hook is not None:
+            hook(d)
+
+
+class _Session:
+    def __init__(self, ydl, dispatcher):
+        self.ydl = ydl
+        self.dispatcher = dispatcher
+        self.uses = 0
+
+
+class SessionPool:
+    """YoutubeDL sessions kept per option profile and lent out one borrower at a time
+
+    Options that change between jobs of the same profile (the output
+    ``paths``) are passed to ``borrow`` and set on the session for that
+    borrow only. A session is closed instead of returned once it was used
+    ``max_uses`` times, or when the borrower raised.
+    """
+    def __init__(self, max_uses=DEFAULT_MAX_USES, create_session=RangeYoutubeDL):
+        self.max_uses = max(1, int(max_uses))
+        self.create_session = create_session
+        self.created = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    @contextlib.contextmanager
+    def borrow(self, ydl_opts, progress_hook=None, **params):
+        """Lend a session built from ``ydl_opts`` (without progress hooks) for the ``with`` body"""
+        key = get_profile_key(ydl_opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+            if session is not None:
+                self.reused += 1
+        if session is None:
+            dispatcher = ProgressDispatcher()
+            session = _Session(self.create_session(dict(ydl_opts, progress_hooks=[dispatcher])),
+                               dispatcher)
+            with self._lock:
+                self.created += 1
+
+        session.ydl.params.update(params)
+        session.dispatcher.hook = progress_hook
+        try:
+            yield session.ydl
+        except BaseException:
+            # A failed download may leave a connection or cookie in a bad state
+            session.ydl.close()
+            raise
+        finally:
+            session.dispatcher.hook = None
+            session.uses += 1
+
+        if session.uses >= self.max_uses:
+            session.ydl.close()
+            return
+        with self._lock:
+            self._idle.setdefault(key, []).append(session)
+
+    def close(self):
+        """Close every idle session; borrowed ones are kept until they come back"""
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.ydl.close()
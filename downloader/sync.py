@@ -0,0 +1,147 @@
+"""
+Remembered state of synced channels and playlists, so a sync only queues new videos
+"""
+
+import sqlite3
+import threading
+import time
+
+from downloader.paths import get_data_path
+from downloader.playlist import is_playlist_url
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class SyncState:
+    """SQLite record of the videos each channel or playlist listed in earlier syncs
+
+    Every collection keeps the newest video ID and upload date of its last
+    complete listing, and every video it listed keeps whether it was
+    downloaded. Videos are ``confirmed`` once the listing they came from
+    finished, so a listing that broke off halfway is walked again past them.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_data_path('sync_state.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS collections (
+                    url TEXT PRIMARY KEY,
+                    newest_id TEXT,
+                    newest_upload_date TEXT,
+                    synced_at REAL NOT NULL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    collection TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    title TEXT,
+                    upload_date TEXT,
+                    status TEXT NOT NULL,
+                    confirmed INTEGER NOT NULL DEFAULT 0,
+                    listed_at REAL NOT NULL,
+                    PRIMARY KEY (collection, video_id)
+                )""")
+
+    def start(self, url):
+        """Begin syncing a collection; returns its ``CollectionSync``"""
+        with self._lock:
+            collection = self._conn.execute(
+                "SELECT newest_id, newest_upload_date, synced_at FROM collections WHERE url = ?",
+                (url,)).fetchone()
+            rows = self._conn.execute(
+                "SELECT video_id, url, title, status, confirmed FROM videos WHERE collection = ?",
+                (url,)).fetchall()
+        return CollectionSync(self, url, collection, rows)
+
+    def add_video(self, collection, entry):
+        """Record a newly listed video as pending"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO videos VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (collection, entry['id'], entry['url'], entry.get('title'), entry.get('upload_date'),
+                 PENDING, time.time()))
+
+    def set_status(self, collection, video_id, success):
+        """Record whether a listed video was downloaded"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE videos SET status = ? WHERE collection = ? AND video_id = ?",
+                (DONE if success else FAILED, collection, video_id))
+
+    def finish(self, collection, newest):
+        """Record a complete listing; ``newest`` is its newest new entry, or None"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE videos SET confirmed = 1 WHERE collection = ?", (collection,))
+            self._conn.execute(
+                "INSERT INTO collections (url, synced_at) VALUES (?, ?)"
+                " ON CONFLICT (url) DO UPDATE SET synced_at = excluded.synced_at", (collection, now))
+            if newest is not None:
+                self._conn.execute(
+                    "UPDATE collections SET newest_id = ?, newest_upload_date = ? WHERE url = ?",
+                    (newest['id'], newest.get('upload_date'), collection))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CollectionSync:
+    """One sync of a channel or playlist
+
+    Channels list their newest uploads first, so their listing (each tab
+    on its own) stops at the first video a finished sync already saw.
+    Playlists can gain videos anywhere and are listed in full, with known
+    videos left out. Videos that were listed before but never downloaded
+    are queued again.
+    """
+    def __init__(self, state, url, collection, rows):
+        self.state = state
+        self.url = url
+        self.synced_before = collection is not None
+        self.newest_id = collection[0] if collection else None
+        self.newest_upload_date = collection[1] if collection else None
+        self.stops_early = self.synced_before and not is_playlist_url(url)
+        self.known_ids = {row[0] for row in rows}
+        self.confirmed_ids = {row[0] for row in rows if row[4]}
+        self.unfinished = [{'id': video_id, 'url': video_url, 'title': title}
+                           for video_id, video_url, title, status, confirmed in rows if status != DONE]
+        self.new_count = 0
+        self.newest = None
+
+    def stop_at(self, entry):
+        """Check whether a listing has reached videos an earlier sync saw"""
+        return self.stops_early and entry.get('id') in self.confirmed_ids
+
+    def filter(self, entries):
+        """Yield the new entries of a listing, recording each as it goes by"""
+        for entry in entries:
+            video_id = entry.get('id')
+            if video_id in self.known_ids:
+                continue
+            if video_id:
+                self.known_ids.add(video_id)
+                self.state.add_video(self.url, entry)
+                # Channels list newest first; playlists append at the end
+                if self.newest is None or is_playlist_url(self.url):
+                    self.newest = entry
+            self.new_count += 1
+            yield entry
+
+    def get_entries(self, entries):
+        """Yield the new entries of a listing, then the earlier ones still not downloaded"""
+        yield from self.filter(entries)
+        yield from self.unfinished
+
+    def set_status(self, video_id, success):
+        self.state.set_status(self.url, video_id, success)
+
+    def finish(self):
+        """Record that the whole listing was walked"""
+        self.state.finish(self.url, self.newest)
@@ -0,0 +1,131 @@
+"""
+URL list behind the app's URL view: bulk adds, batched validation, dedupe
+"""
+
+from collections import deque
+
+from downloader.urls import canonical_video_id, is_valid_youtube_url
+
+PENDING = 'pending'
+VALID = 'valid'
+INVALID = 'invalid'
+DUPLICATE = 'duplicate'
+
+
+def parse_urls(text):
+    """Split pasted text or a URL file into URLs
+
+    URLs may be separated by newlines or whitespace; blank lines and lines
+    starting with '#' are ignored.
+    """
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.extend(line.split())
+    return urls
+
+
+def get_dedupe_key(url):
+    """Get the key two URLs share when they point at the same video or page"""
+    video_id = canonical_video_id(url)
+    return f'video:{video_id}' if video_id else url.rstrip('/')
+
+
+class URLEntry:
+    """One URL in the list and the result of validating it"""
+    __slots__ = ('url', 'status', 'key', 'removed')
+
+    def __init__(self, url):
+        self.url = url
+        self.status = PENDING
+        self.key = None
+        self.removed = False
+
+
+class URLList:
+    """Ordered URLs with validation that runs in batches
+
+    ``add`` only appends, so pasting thousands of URLs returns at once;
+    ``validate_pending`` then checks up to ``limit`` of them per call
+    against one precompiled pattern. A URL whose video (or playlist, or
+    channel) is already in the list is marked ``DUPLICATE`` and left out of
+    ``get_urls``.
+    """
+    def __init__(self):
+        self.entries = []
+        self._pending = deque()
+        self._seen = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, urls):
+        """Append URLs for validation; returns how many were added"""
+        added = 0
+        for url in urls:
+            url = url.strip()
+            if url:
+                entry = URLEntry(url)
+                self.entries.append(entry)
+                self._pending.append(entry)
+                added += 1
+        return added
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def validate_pending(self, limit=None):
+        """Validate up to ``limit`` pending URLs; returns how many are still pending"""
+        count = 0
+        while self._pending and (limit is None or count < limit):
+            entry = self._pending.popleft()
+            if entry.removed:
+                continue
+            count += 1
+            if not is_valid_youtube_url(entry.url):
+                entry.status = INVALID
+                continue
+            entry.key = get_dedupe_key(entry.url)
+            if entry.key in self._seen:
+                entry.status = DUPLICATE
+            else:
+                entry.status = VALID
+                self._seen[entry.key] = entry
+        return len(self._pending)
+
+    def remove(self, entries):
+        """Remove entries from the list
+
+        If a removed URL had duplicates, the first of them takes its place.
+        """
+        removed = set(map(id, entries))
+        freed = set()
+        for entry in entries:
+            entry.removed = True
+            if entry.status == VALID and self._seen.get(entry.key) is entry:
+                del self._seen[entry.key]
+                freed.add(entry.key)
+        self.entries = [entry for entry in self.entries if id(entry) not in removed]
+
+        for entry in self.entries:
+            if entry.status == DUPLICATE and entry.key in freed:
+                entry.status = VALID
+                self._seen[entry.key] = entry
+                freed.discard(entry.key)
+
+    def clear(self):
+        for entry in self.entries:
+            entry.removed = True
+        self.entries = []
+        self._pending.clear()
+        self._seen.clear()
+
+    def get_urls(self):
+        """Get the valid, unique URLs in the order they were added"""
+        self.validate_pending()
+        return [entry.url for entry in self.entries if entry.status == VALID]
+
+    def count(self, status):
+        return sum(1 for entry in self.entries if entry.status == status)
@@ -0,0 +1,49 @@
+"""
+YouTube URL helpers
+"""
+
+import re
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID_RE = re.compile(r'^[\w-]{11}$')
+
+# Scheme and host of every youtube.com URL the app handles
+YOUTUBE_HOST_RE = r'https?://(?:(?:www|m|music)\.)?youtube\.com/'
+
+# Any URL the app accepts: single videos, playlists and channels
+YOUTUBE_URL_RE = re.compile(
+    r'(?:' + YOUTUBE_HOST_RE +
+    r'(?:watch\?(?:[^#\s]*&)?v=|playlist\?list=|channel/|c/|user/|@|shorts/|embed/|live/)'
+    r'|https?://(?:(?:www|m|music)\.)?youtu\.be/)[\w-]+')
+
+_SHORT_HOSTS = ('youtu.be',)
+_LONG_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+
+
+def canonical_video_id(url):
+    """Get the 11 character video ID of a single-video URL, or None"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or '').lower()
+    video_id = None
+    if host in _SHORT_HOSTS:
+        video_id = parsed.path.lstrip('/').split('/')[0]
+    elif host in _LONG_HOSTS:
+        if parsed.path == '/watch':
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+        else:
+            parts = parsed.path.strip('/').split('/')
+            if len(parts) >= 2 and parts[0] in ('shorts', 'embed', 'live', 'v'):
+                video_id = parts[1]
+
+    if video_id and VIDEO_ID_RE.match(video_id):
+        return video_id
+    return None
+
+
+def is_valid_youtube_url(url):
+    """Check whether a URL looks like a YouTube video, playlist or channel"""
+    return YOUTUBE_URL_RE.match(url) is not None
@@ -0,0 +1,71 @@
+"""
+Background loading of yt-dlp and the download engine
+
+Importing yt-dlp and building its extractor registry takes most of the
+app's start-up time (longer still in the PyInstaller build, which unpacks
+first). ``EngineLoader`` does both on a background thread so the window
+can show while the user is still typing URLs.
+"""
+
+import threading
+import time
+
+
+class EngineLoader:
+    """Import ``downloader.engine`` and warm up yt-dlp off the calling thread
+
+    ``on_ready`` is called on the loader thread with None, or with the
+    exception that stopped the engine from loading.
+    """
+    def __init__(self, on_ready=None):
+        self.on_ready = on_ready
+        self.error = None
+        # Seconds the import and warm-up took
+        self.seconds = None
+        self._engine = None
+        self._thread = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start loading; does nothing if loading already started"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._load, name="engine-loader")
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        return self._loaded.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """Wait for the engine module, loading it on this thread if nobody started it
+
+        Raises the loading error, or ``TimeoutError`` if ``timeout`` passed.
+        """
+        self.start()
+        if not self._loaded.wait(timeout):
+            raise TimeoutError("The download engine is still loading")
+        if self.error is not None:
+            raise self.error
+        return self._engine
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            import downloader.engine
+            from yt_dlp.extractor import gen_extractor_classes
+
+            # YoutubeDL builds the extractor registry on first use; without
+            # lazy extractors this imports every extractor module
+            gen_extractor_classes()
+            self._engine = downloader.engine
+        except Exception as e:
+            self.error = e
+        self.seconds = time.perf_counter() - started
+        self._loaded.set()
+        if self.on_ready:
+            self.on_ready(self.error)
@@ -0,0 +1,30 @@
+"""
+Tests for the URL patterns that decide how a URL is queued
+"""
+
+from downloader.playlist import is_collection_url, is_playlist_url
+from downloader.urls import canonical_video_id, is_valid_youtube_url
+
+MUSIC_PLAYLIST_URL = 'https://music.youtube.com/playlist?list=OLAK5uy_kAbC123dEf456gHi789jKl'
+
+
+def test_music_playlist_is_expanded_into_entries():
+    assert is_valid_youtube_url(MUSIC_PLAYLIST_URL)
+    assert is_collection_url(MUSIC_PLAYLIST_URL)
+    assert is_playlist_url(MUSIC_PLAYLIST_URL)
+    assert canonical_video_id(MUSIC_PLAYLIST_URL) is None
+
+
+def test_accepted_collections_are_recognized_on_every_host():
+    for host in ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com'):
+        for path in ('playlist?list=PL1234567890', 'channel/UC1234567890', '@someone'):
+            url = f'https://{host}/{path}'
+            assert is_valid_youtube_url(url), url
+            assert is_collection_url(url), url
+
+
+def test_music_video_is_a_single_video():
+    url = 'https://music.youtube.com/watch?v=dQw4w9WgXcQ'
+    assert is_valid_youtube_url(url)
+    assert not is_collection_url(url)
+    assert canonical_video_id(url) == 'dQw4w9WgXcQ'
@@ -1,77 +1,127 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
-import yt_dlp
 import os
 import threading
-from pathlib import Path
-import re
 
-class URLInputBox:
-    """Individual URL input box with remove button"""
-    def __init__(self, parent, index, on_remove):
-        self.frame = ttk.Frame(parent)
-        self.index = index
-        self.on_remove = on_remove
-        
-        # URL entry
-        self.url_entry = ttk.Entry(self.frame, width=60)
-        self.url_entry.pack(side='left', fill='x', expand=True, padx=(0, 5))
+from downloader.events import EventQueue, open_log_file
+from downloader.metrics import MetricsCollector
+from downloader.options import AUDIO_FORMATS, VIDEO_QUALITIES, DownloadOptions
+from downloader.paths import get_data_path
+from downloader.profiling import Profiler
+from downloader.progress import format_bytes, format_eta
+from downloader.url_list import DUPLICATE, INVALID, PENDING, VALID, URLList, parse_urls
+from downloader.warmup import EngineLoader
+
+# How often queued worker events are applied to the widgets
+UI_TICK_MS = 100
+# Lines kept in the status log; the full log is written to the log file
+MAX_LOG_LINES = 500
+# URLs validated per UI tick after a bulk paste or import
+URL_VALIDATION_BATCH = 1000
+
+class URLListView:
+    """Scrollable list of URLs that only renders the rows in view
+
+    The listbox holds ``rows`` lines at a time and is refilled from the
+    ``URLList`` whenever the view scrolls or the list changes, so tens of
+    thousands of URLs cost no more to show than ten.
+    """
+    STATUS_STYLES = {
+        PENDING: ('…', 'gray'),
+        VALID: ('✓', 'green'),
+        INVALID: ('✗', 'red'),
+        DUPLICATE: ('⧉', 'orange'),
+    }
+
+    def __init__(self, parent, url_list, rows=8):
+        self.url_list = url_list
+        self.rows = rows
+        self.offset = 0
+        self.selected = set()
+        self.on_delete = None
+        self.on_prioritize = None
         
-        # Remove button (only show if not the first box)
-        if index > 0:
-            self.remove_btn = ttk.Button(self.frame, text="✕", width=3, 
-                                       command=self.remove_box)
-            self.remove_btn.pack(side='right')
-        
-        # URL validation indicator
-        self.status_label = ttk.Label(self.frame, text="", font=('Arial', 8))
-        self.status_label.pack(side='right', padx=(0, 5))
-        
-        # Bind URL validation
-        self.url_entry.bind('<KeyRelease>', self.validate_url)
-    
-    def validate_url(self, event=None):
-        """Validate YouTube URL and update status"""
-        url = self.url_entry.get().strip()
-        if not url:
-            self.status_label.config(text="", foreground="black")
-        elif self.is_valid_youtube_url(url):
-            self.status_label.config(text="✓", foreground="green")
-        else:
-            self.status_label.config(text="✗", foreground="red")
-    
-    def is_valid_youtube_url(self, url):
-        """Check if the URL is a valid YouTube URL"""
-        youtube_patterns = [
-            r'https?://(?:www\.)?youtube\.com/watch\?v=[\w-]+',
-            r'https?://(?:www\.)?youtu\.be/[\w-]+',
-            r'https?://(?:www\.)?youtube\.com/playlist\?list=[\w-]+',
-            r'https?://(?:www\.)?youtube\.com/channel/[\w-]+',
-            r'https?://(?:www\.)?youtube\.com/c/[\w-]+',
-            r'https?://(?:www\.)?youtube\.com/user/[\w-]+'
-        ]
-        
-        for pattern in youtube_patterns:
-            if re.match(pattern, url):
-                return True
-        return False
-    
-    def get_url(self):
-        """Get the URL from this input box"""
-        return self.url_entry.get().strip()
-    
-    def remove_box(self):
-        """Remove this URL input box"""
-        self.frame.destroy()
-        self.on_remove(self.index)
-    
+        self.frame = ttk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, height=rows, selectmode='extended',
+                                  activestyle='none', exportselection=False)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        
+        self.listbox.bind('<<ListboxSelect>>', self.on_select)
+        self.listbox.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll(3))
+        self.listbox.bind('<Delete>', lambda e: self.on_delete and self.on_delete())
+        
+        # Right-click menu for the selected URLs
+        self.menu = tk.Menu(self.listbox, tearoff=0)
+        self.menu.add_command(label="Download Next", 
+                              command=lambda: self.on_prioritize and self.on_prioritize())
+        self.menu.add_command(label="Remove", command=lambda: self.on_delete and self.on_delete())
+        self.listbox.bind('<Button-3>', self.show_menu)
+
     def pack(self, **kwargs):
         """Pack the frame"""
         self.frame.pack(**kwargs)
-    
-    def pack_forget(self):
-        """Unpack the frame"""
-        self.frame.pack_forget()
+
+    def visible_entries(self):
+        return self.url_list.entries[self.offset:self.offset + self.rows]
+
+    def refresh(self):
+        """Redraw the rows in view"""
+        total = len(self.url_list)
+        self.offset = max(0, min(self.offset, total - self.rows))
+        self.listbox.delete(0, 'end')
+        for row, entry in enumerate(self.visible_entries()):
+            symbol, color = self.STATUS_STYLES[entry.status]
+            self.listbox.insert('end', f"{symbol} {self.offset + row + 1}. {entry.url}")
+            self.listbox.itemconfig(row, foreground=color)
+            if id(entry) in self.selected:
+                self.listbox.selection_set(row)
+        if total > self.rows:
+            self.scrollbar.set(self.offset / total, (self.offset + self.rows) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def yview(self, action, value, unit=None):
+        """Scrollbar callback: scroll the view over the whole list"""
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.url_list))
+        elif action == 'scroll':
+            self.offset += int(value) * (self.rows if unit == 'pages' else 1)
+        self.refresh()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+        return 'break'
+
+    def on_mouse_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_select(self, event=None):
+        """Remember the selection by entry so it survives scrolling"""
+        visible = self.visible_entries()
+        self.selected.difference_update(id(entry) for entry in visible)
+        self.selected.update(id(visible[row]) for row in self.listbox.curselection()
+                             if row < len(visible))
+
+    def show_menu(self, event):
+        """Open the context menu, selecting the clicked row if it is not selected"""
+        row = self.listbox.nearest(event.y)
+        if row >= 0 and not self.listbox.selection_includes(row):
+            self.listbox.selection_clear(0, 'end')
+            self.listbox.selection_set(row)
+            self.selected.clear()
+            self.on_select()
+        self.menu.tk_popup(event.x_root, event.y_root)
+
+    def get_selected_entries(self):
+        return [entry for entry in self.url_list.entries if id(entry) in self.selected]
+
+    def clear_selection(self):
+        self.selected.clear()
 
 class YouTubeDownloaderApp:
     def __init__(self, root):
@@ -95,16 +145,48 @@ class YouTubeDownloaderApp:
             }
         }
         
-        # URL input boxes management
-        self.url_boxes = []
-        self.next_box_id = 0
+        # URLs to download, validated in batches on the Tk main loop
+        self.url_list = URLList()
+        self.validation_scheduled = False
         
         # Batch download tracking
         self.total_urls = 0
         self.completed_urls = 0
-        self.current_url_index = 0
+        
+        # Metadata shared between the video and audio jobs of a URL, the
+        # archive and the journal are opened once the engine has loaded
+        self.metadata = None
+        self.sessions = None
+        self.archive = None
+        self.journal = None
+        self.engine = None
+        
+        # Totals for the node exporter's textfile collector; set YTDL_PROFILE
+        # to a file name to also profile downloads with cProfile
+        try:
+            metrics_path = get_data_path('metrics.prom')
+        except OSError:
+            metrics_path = None
+        self.metrics = MetricsCollector(prometheus_path=metrics_path)
+        self.profile_path = os.environ.get('YTDL_PROFILE')
+        self.profiler = Profiler() if self.profile_path else None
+        
+        # Worker threads never touch Tk directly; they post events that the
+        # main loop applies on a fixed tick
+        self.events = EventQueue()
+        try:
+            self.file_log = open_log_file()
+        except Exception:
+            self.file_log = None
         
         self.setup_ui()
+        self.root.after(UI_TICK_MS, self.process_events)
+        
+        # yt-dlp loads in the background once the window is up; downloads
+        # are enabled when it is ready
+        self.loader = EngineLoader(on_ready=lambda error: self.post_event(
+            {'type': 'engine_loaded', 'error': error}))
+        self.root.after_idle(self.loader.start)
 
     def setup_ui(self):
         # Main frame with scrollbar
@@ -139,30 +221,44 @@ class YouTubeDownloaderApp:
         
         # Instructions
         instructions = ttk.Label(url_frame, 
-                                text="Add multiple YouTube URLs below. Each box represents one URL to download.",
+                                text="Add YouTube URLs one at a time, paste many at once, or import a text file with one URL per line.",
                                 font=('Arial', 9), foreground='gray')
         instructions.pack(anchor='w', pady=(0, 10))
         
-        # URL boxes container
-        self.url_boxes_frame = ttk.Frame(url_frame)
-        self.url_boxes_frame.pack(fill='x', pady=(0, 10))
-        
-        # Add URL button frame
-        add_button_frame = ttk.Frame(url_frame)
-        add_button_frame.pack(fill='x')
+        # Single URL entry
+        entry_frame = ttk.Frame(url_frame)
+        entry_frame.pack(fill='x', pady=(0, 5))
         
-        # Add URL button
-        add_url_btn = ttk.Button(add_button_frame, text="+ Add Another URL", 
-                                command=self.add_url_box)
-        add_url_btn.pack(side='left')
+        self.url_entry = ttk.Entry(entry_frame, width=60)
+        self.url_entry.pack(side='left', fill='x', expand=True, padx=(0, 5))
+        self.url_entry.bind('<Return>', lambda e: self.add_url_from_entry())
+        
+        add_url_btn = ttk.Button(entry_frame, text="+ Add URL", command=self.add_url_from_entry)
+        add_url_btn.pack(side='right')
+        
+        # URL list, only the visible rows are rendered
+        self.url_list_view = URLListView(url_frame, self.url_list)
+        self.url_list_view.on_delete = self.remove_selected_urls
+        self.url_list_view.on_prioritize = self.prioritize_selected_urls
+        self.url_list_view.pack(fill='x', pady=(0, 5))
+        
+        # Bulk actions
+        list_button_frame = ttk.Frame(url_frame)
+        list_button_frame.pack(fill='x')
+        
+        ttk.Button(list_button_frame, text="Paste URLs", 
+                  command=self.paste_urls).pack(side='left')
+        ttk.Button(list_button_frame, text="Import File...", 
+                  command=self.import_urls).pack(side='left', padx=(5, 0))
+        ttk.Button(list_button_frame, text="Remove Selected", 
+                  command=self.remove_selected_urls).pack(side='left', padx=(5, 0))
+        ttk.Button(list_button_frame, text="Download Selected Next", 
+                  command=self.prioritize_selected_urls).pack(side='left', padx=(5, 0))
         
         # URL count label
-        self.url_count_label = ttk.Label(add_button_frame, text="URLs: 1", font=('Arial', 9))
+        self.url_count_label = ttk.Label(list_button_frame, text="URLs: 0", font=('Arial', 9))
         self.url_count_label.pack(side='right')
         
-        # Add first URL box (after creating url_count_label)
-        self.add_url_box()
-        
         # Download options frame
         options_frame = ttk.LabelFrame(main_frame, text="Download Options", padding="10")
         options_frame.pack(fill='x', pady=(0, 10))
@@ -170,14 +266,19 @@ class YouTubeDownloaderApp:
         # Checkboxes for video and audio options
         self.video_var = tk.BooleanVar(value=True)
         self.audio_var = tk.BooleanVar()
+        self.sync_var = tk.BooleanVar()
         
         video_checkbox = ttk.Checkbutton(options_frame, text="Download Video (MP4)", 
                                        variable=self.video_var)
         audio_checkbox = ttk.Checkbutton(options_frame, text="Download Audio", 
                                        variable=self.audio_var)
+        sync_checkbox = ttk.Checkbutton(options_frame, 
+                                      text="Only new videos from channels/playlists synced before", 
+                                      variable=self.sync_var)
         
         video_checkbox.pack(anchor='w', pady=2)
         audio_checkbox.pack(anchor='w', pady=2)
+        sync_checkbox.pack(anchor='w', pady=2)
         
         # Quality and format selection
         quality_frame = ttk.Frame(options_frame)
@@ -190,7 +291,7 @@ class YouTubeDownloaderApp:
         ttk.Label(video_quality_frame, text="Video Quality:").pack(side='left')
         self.quality_var = tk.StringVar(value="1080p")
         quality_combo = ttk.Combobox(video_quality_frame, textvariable=self.quality_var, 
-                                   values=["720p", "1080p", "1440p", "2160p"], 
+                                   values=VIDEO_QUALITIES, 
                                    state="readonly", width=10)
         quality_combo.pack(side='left', padx=(5, 0))
         
@@ -201,10 +302,32 @@ class YouTubeDownloaderApp:
         ttk.Label(audio_format_frame, text="Audio Format:").pack(side='left')
         self.audio_format_var = tk.StringVar(value="MP3")
         audio_format_combo = ttk.Combobox(audio_format_frame, textvariable=self.audio_format_var, 
-                                        values=["MP3", "M4A", "WAV", "OPUS", "AAC"], 
+                                        values=AUDIO_FORMATS, 
                                         state="readonly", width=10)
         audio_format_combo.pack(side='left', padx=(5, 0))
         
+        # Parallel downloads selection
+        workers_frame = ttk.Frame(quality_frame)
+        workers_frame.pack(fill='x', pady=(5, 0))
+        
+        ttk.Label(workers_frame, text="Parallel Downloads:").pack(side='left')
+        self.max_workers_var = tk.IntVar(value=3)
+        workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=8, 
+                                     textvariable=self.max_workers_var, 
+                                     state="readonly", width=8)
+        workers_spinbox.pack(side='left', padx=(5, 0))
+        
+        # Bandwidth limit, shared by all parallel downloads and adjustable mid-batch
+        bandwidth_frame = ttk.Frame(quality_frame)
+        bandwidth_frame.pack(fill='x', pady=(5, 0))
+        
+        ttk.Label(bandwidth_frame, text="Bandwidth Limit (MB/s, 0 = unlimited):").pack(side='left')
+        self.rate_limit_var = tk.StringVar(value="0")
+        rate_limit_spinbox = ttk.Spinbox(bandwidth_frame, from_=0, to=1000, increment=0.5, 
+                                        textvariable=self.rate_limit_var, width=8)
+        rate_limit_spinbox.pack(side='left', padx=(5, 0))
+        self.rate_limit_var.trace_add('write', self.on_rate_limit_change)
+        
         # Folder selection frame
         folder_frame = ttk.LabelFrame(main_frame, text="Download Location", padding="10")
         folder_frame.pack(fill='x', pady=(0, 10))
@@ -225,7 +348,7 @@ class YouTubeDownloaderApp:
                                           maximum=100, length=400)
         self.progress_bar.pack(fill='x', pady=(0, 5))
         
-        self.progress_label = ttk.Label(progress_frame, text="Ready to download")
+        self.progress_label = ttk.Label(progress_frame, text="Loading downloader...")
         self.progress_label.pack()
         
         # Button frame
@@ -234,7 +357,7 @@ class YouTubeDownloaderApp:
         
         # Download button
         self.download_button = ttk.Button(button_frame, text="Download All URLs", 
-                                         command=self.start_download)
+                                         command=self.start_download, state='disabled')
         self.download_button.pack(side='left', padx=(0, 10))
         
         # Refresh button
@@ -251,45 +374,90 @@ class YouTubeDownloaderApp:
         status_scrollbar.pack(side='right', fill='y')
         self.status_text.configure(yscrollcommand=status_scrollbar.set)
 
-    def add_url_box(self):
-        """Add a new URL input box"""
-        box = URLInputBox(self.url_boxes_frame, self.next_box_id, self.remove_url_box)
-        box.pack(fill='x', pady=2)
-        self.url_boxes.append(box)
-        self.next_box_id += 1
-        self.update_url_count()
-        
-        # Focus on the new box
-        box.url_entry.focus()
+    def add_url_from_entry(self):
+        """Add the URL(s) typed into the entry"""
+        if self.add_urls(parse_urls(self.url_entry.get())):
+            self.url_entry.delete(0, 'end')
+        self.url_entry.focus()
 
-    def remove_url_box(self, index):
-        """Remove a URL input box"""
-        # Find and remove the box
-        for i, box in enumerate(self.url_boxes):
-            if box.index == index:
-                self.url_boxes.pop(i)
-                break
-        
-        # Reindex remaining boxes
-        for i, box in enumerate(self.url_boxes):
-            box.index = i
-        
-        self.next_box_id -= 1
+    def paste_urls(self):
+        """Add every URL on the clipboard"""
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return
+        self.add_urls(parse_urls(text))
+
+    def import_urls(self):
+        """Add the URLs from a text file"""
+        path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                urls = parse_urls(f.read())
+        except OSError as e:
+            messagebox.showerror("Import Error", f"Could not read {path}: {e}")
+            return
+        self.log_message(f"📄 Imported {len(urls)} URL(s) from {path}")
+        self.add_urls(urls)
+
+    def add_urls(self, urls):
+        """Add URLs to the list and validate them in the background"""
+        added = self.url_list.add(urls)
+        if added:
+            # Show the newly added URLs
+            self.url_list_view.offset = len(self.url_list)
+            self.schedule_url_validation()
+        return added
+
+    def schedule_url_validation(self):
+        if not self.validation_scheduled:
+            self.validation_scheduled = True
+            self.root.after(0, self.validate_urls)
+
+    def validate_urls(self):
+        """Validate the next batch of URLs, then yield to the main loop"""
+        self.validation_scheduled = False
+        if self.url_list.validate_pending(URL_VALIDATION_BATCH):
+            self.schedule_url_validation()
+        self.url_list_view.refresh()
         self.update_url_count()
 
+    def remove_selected_urls(self):
+        """Remove the selected URLs from the list"""
+        entries = self.url_list_view.get_selected_entries()
+        if entries:
+            self.url_list.remove(entries)
+            self.url_list_view.clear_selection()
+            self.url_list_view.refresh()
+            self.update_url_count()
+
+    def prioritize_selected_urls(self):
+        """Move the queued jobs of the selected URLs to the front of the running batch"""
+        if self.engine is None:
+            return
+        urls = {entry.url for entry in self.url_list_view.get_selected_entries()}
+        jobs = [job for job in self.engine.queued_jobs() if job.url in urls or job.parent_url in urls]
+        # Moving the last one first keeps them in their current order
+        for job in reversed(jobs):
+            self.engine.prioritize(job.job_id)
+        if jobs:
+            self.log_message(f"⏫ Moved {len(jobs)} queued job(s) to the front")
+
     def update_url_count(self):
         """Update the URL count display"""
-        count = len(self.url_boxes)
-        self.url_count_label.config(text=f"URLs: {count}")
-
-    def get_urls_from_boxes(self):
-        """Extract URLs from all input boxes"""
-        urls = []
-        for box in self.url_boxes:
-            url = box.get_url()
-            if url and box.is_valid_youtube_url(url):
-                urls.append(url)
-        return urls
+        text = f"URLs: {self.url_list.count(VALID)}"
+        details = [f"{self.url_list.count(status)} {label}"
+                   for status, label in ((INVALID, "invalid"), (DUPLICATE, "duplicate"), (PENDING, "checking"))
+                   if self.url_list.count(status)]
+        if details:
+            text += f" ({', '.join(details)})"
+        self.url_count_label.config(text=text)
+
+    def get_urls(self):
+        """Get the valid URLs, without duplicates"""
+        return self.url_list.get_urls()
 
     def select_folder(self):
         """Select download folder"""
@@ -300,28 +468,26 @@ class YouTubeDownloaderApp:
 
     def refresh_app(self):
         """Refresh the application state for new downloads"""
-        # Clear all URL boxes except the first one
-        while len(self.url_boxes) > 1:
-            self.url_boxes[-1].remove_box()
-        
-        # Clear the first box
-        if self.url_boxes:
-            self.url_boxes[0].url_entry.delete(0, 'end')
+        # Clear the URL list
+        self.url_list.clear()
+        self.url_list_view.clear_selection()
+        self.url_list_view.refresh()
+        self.url_entry.delete(0, 'end')
         
         # Reset progress
         self.progress_var.set(0)
-        self.progress_label.config(text="Ready to download")
+        self.progress_label.config(text="Ready to download" if self.loader.ready else "Loading downloader...")
         
         # Clear status text
         self.status_text.delete(1.0, 'end')
         
         # Re-enable download button
-        self.download_button.config(state='normal')
+        if self.loader.ready:
+            self.download_button.config(state='normal')
         
         # Reset batch tracking
         self.total_urls = 0
         self.completed_urls = 0
-        self.current_url_index = 0
         
         # Update URL count
         self.update_url_count()
@@ -329,112 +495,163 @@ class YouTubeDownloaderApp:
         # Log refresh message
         self.log_message("🔄 Application refreshed - ready for new downloads")
         
-        # Focus on first URL box
-        if self.url_boxes:
-            self.url_boxes[0].url_entry.focus()
+        # Focus on the URL entry
+        self.url_entry.focus()
 
     def log_message(self, message):
-        """Add message to status text"""
-        self.status_text.insert('end', f"{message}\n")
+        """Queue a message for the status log; safe to call from any thread"""
+        self.post_event({'type': 'log', 'message': message})
+
+    def post_event(self, event):
+        """Queue an event for the UI thread; used as the engine listener"""
+        if event['type'] == 'log' and self.file_log:
+            self.file_log.info(event['message'])
+        self.events.post(event)
+
+    def process_events(self):
+        """Apply queued events on the Tk main loop, then schedule the next tick"""
+        try:
+            self.flush_events()
+        finally:
+            self.root.after(UI_TICK_MS, self.process_events)
+
+    def flush_events(self):
+        """Apply all queued events to the widgets"""
+        log_lines = []
+        for event in self.events.drain():
+            if event['type'] == 'log':
+                log_lines.append(event['message'])
+                continue
+            if log_lines:
+                self.append_log(log_lines)
+                log_lines = []
+            self.handle_engine_event(event)
+        if log_lines:
+            self.append_log(log_lines)
+
+    def append_log(self, lines):
+        """Append lines to the status text, keeping only the most recent ones"""
+        self.status_text.insert('end', '\n'.join(lines) + '\n')
+        line_count = int(self.status_text.index('end-1c').split('.')[0])
+        if line_count > MAX_LOG_LINES:
+            self.status_text.delete('1.0', f'{line_count - MAX_LOG_LINES}.0')
         self.status_text.see('end')
-        self.root.update_idletasks()
-
-    def progress_hook(self, d):
-        """Progress callback for yt-dlp"""
-        if d['status'] == 'downloading':
-            try:
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                downloaded = d.get('downloaded_bytes', 0)
-                if total > 0:
-                    # Calculate overall progress including batch progress
-                    file_progress = (downloaded / total) * 100
-                    batch_progress = (self.completed_urls / self.total_urls) * 100 if self.total_urls > 0 else 0
-                    overall_progress = (batch_progress + (file_progress / self.total_urls)) if self.total_urls > 0 else file_progress
-                    
-                    self.progress_var.set(overall_progress)
-                    self.progress_label.config(text=f"URL {self.current_url_index}/{self.total_urls} - Downloading: {file_progress:.1f}%")
-            except:
-                pass
-        elif d['status'] == 'finished':
+
+    def handle_engine_event(self, event):
+        """Show download engine events in the UI"""
+        event_type = event['type']
+        if event_type == 'progress':
+            job = event['job']
+            self.progress_var.set(event['batch_progress'])
+            text = f"URL {job.url_index}/{self.engine.total_urls} ({job.download_type}) - Downloading: {job.progress * 100:.1f}%"
+            if event['speed']:
+                text += f" | {format_bytes(event['speed'])}/s, batch ETA {format_eta(event['eta'])}"
+            self.progress_label.config(text=text)
+        elif event_type == 'file_downloaded':
             self.progress_label.config(text="Processing...")
-            self.log_message(f"Downloaded: {d['filename']}")
-
-    def get_ydl_opts(self, download_type):
-        """Get yt-dlp options based on download type"""
-        if download_type == 'video':
-            quality = self.quality_var.get()
-            height = quality.replace('p', '')
-            format_str = f'best[height<={height}]/best'
-        else:  # audio
-            audio_format = self.audio_format_var.get().lower()
-            if audio_format == 'mp3':
-                format_str = 'bestaudio[ext=m4a]/bestaudio'
-                postprocessors = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-            elif audio_format == 'm4a':
-                format_str = 'bestaudio[ext=m4a]/bestaudio'
-                postprocessors = []
-            elif audio_format == 'wav':
-                format_str = 'bestaudio[ext=m4a]/bestaudio'
-                postprocessors = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'wav',
-                }]
-            elif audio_format == 'opus':
-                format_str = 'bestaudio[ext=opus]/bestaudio'
-                postprocessors = []
-            elif audio_format == 'aac':
-                format_str = 'bestaudio[ext=m4a]/bestaudio'
-                postprocessors = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'aac',
-                }]
-            else:
-                format_str = 'bestaudio[ext=m4a]/bestaudio'
-                postprocessors = []
-        
-        opts = {
-            'format': format_str,
-            'outtmpl': os.path.join(self.download_folder, '%(title)s.%(ext)s'),
-            'progress_hooks': [self.progress_hook],
-            'ignoreerrors': False,
-            'no_warnings': False,
-            'quiet': False,
-        }
+        elif event_type == 'url_finished':
+            self.completed_urls = self.engine.completed_urls
+            self.progress_var.set(self.engine.get_batch_progress())
+        elif event_type == 'batch_finished':
+            self.show_batch_result(event['result'])
+        elif event_type == 'engine_loaded':
+            self.on_engine_loaded(event['error'])
+        elif event_type == 'batch_error':
+            self.log_message(f"❌ Unexpected error during batch download: {event['error']}")
+            self.flush_events()
+            self.download_button.config(state='normal')
+            messagebox.showerror("Error", f"An unexpected error occurred: {event['error']}")
+
+    def on_engine_loaded(self, error):
+        """Open the caches and enable downloads once yt-dlp has loaded"""
+        if error is not None:
+            self.progress_label.config(text="Downloader failed to load")
+            self.log_message(f"❌ Could not load yt-dlp: {error}")
+            messagebox.showerror("Error", f"Could not load yt-dlp: {error}")
+            return
         
-        if download_type == 'audio' and 'postprocessors' in locals():
-            opts['postprocessors'] = postprocessors
+        from downloader.engine import open_download_archive, open_job_journal, open_metadata_cache
+        from downloader.extraction import MetadataStore
+        from downloader.sessions import SessionPool
         
-        return opts
+        # yt-dlp sessions stay warm from one batch to the next
+        self.sessions = SessionPool()
+        self.metadata = MetadataStore(cache=open_metadata_cache(), sessions=self.sessions)
+        self.archive = open_download_archive()
+        self.journal = open_job_journal()
+        self.progress_label.config(text="Ready to download")
+        self.download_button.config(state='normal')
+        self.offer_resume()
+
+    def get_download_options(self):
+        """Collect the download options selected in the UI"""
+        # Parallel Downloads is a ceiling; throttling may still lower it
+        max_workers = max(1, int(self.max_workers_var.get()))
+        return DownloadOptions(download_folder=self.download_folder,
+                               video_quality=self.quality_var.get(),
+                               audio_format=self.audio_format_var.get(),
+                               max_workers=max_workers, max_workers_limit=max_workers,
+                               rate_limit=self.get_rate_limit(),
+                               sync=self.sync_var.get())
 
-    def download_with_yt_dlp(self, url, download_type):
-        """Download using yt-dlp"""
+    def get_rate_limit(self):
+        """Get the bandwidth limit in bytes per second (0 for unlimited)"""
         try:
-            ydl_opts = self.get_ydl_opts(download_type)
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get video info first
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown')
-                
-                self.log_message(f"Starting {download_type} download: {title}")
-                
-                # Download the video/audio
-                ydl.download([url])
-                
-                self.log_message(f"✅ {download_type.title()} download completed!")
-                return True
-                
-        except Exception as e:
-            self.log_message(f"❌ Error downloading {download_type}: {str(e)}")
-            return False
+            return max(0, int(float(self.rate_limit_var.get()) * 1024 * 1024))
+        except ValueError:
+            return 0
+
+    def on_rate_limit_change(self, *args):
+        """Apply a new bandwidth limit to the running batch"""
+        if self.engine is not None:
+            self.engine.set_rate_limit(self.get_rate_limit())
+
+    def create_engine(self, options):
+        """Create a download engine that shares the app's caches and journal"""
+        from downloader.engine import DownloadEngine
+        
+        return DownloadEngine(options, listener=self.post_event, metadata=self.metadata,
+                              archive=self.archive, journal=self.journal, metrics=self.metrics,
+                              profiler=self.profiler, sessions=self.sessions)
+
+    def offer_resume(self):
+        """Offer to resume a batch that was interrupted by a crash or exit"""
+        unfinished = self.journal.get_unfinished_batch() if self.journal else None
+        if unfinished is None:
+            return
+        
+        batch_id, stored_options, pending = unfinished
+        options = DownloadOptions.from_dict(stored_options)
+        if not messagebox.askyesno("Resume Download",
+                                   f"A batch download was interrupted with {pending} unfinished job(s).\n"
+                                   f"Resume it now?"):
+            self.create_engine(options).discard_batch(batch_id)
+            return
+        
+        # Show the options the batch was started with
+        self.download_folder = options.download_folder
+        self.folder_label.config(text=f"Folder: {self.download_folder}")
+        self.quality_var.set(options.video_quality)
+        self.audio_format_var.set(options.audio_format)
+        self.max_workers_var.set(options.max_workers)
+        self.rate_limit_var.set(f"{options.rate_limit / (1024 * 1024):g}")
+        self.sync_var.set(options.sync)
+        
+        self.download_button.config(state='disabled')
+        self.progress_var.set(0)
+        self.progress_label.config(text="Resuming batch download...")
+        
+        self.engine = self.create_engine(options)
+        download_thread = threading.Thread(target=self.batch_download, args=([], batch_id))
+        download_thread.daemon = True
+        download_thread.start()
 
     def start_download(self):
         """Start the batch download process"""
-        urls = self.get_urls_from_boxes()
+        # A URL typed into the entry but not added yet counts too
+        if self.url_entry.get().strip():
+            self.add_url_from_entry()
+        urls = self.get_urls()
         
         if not urls:
             messagebox.showwarning("Input Error", "Please enter at least one valid YouTube URL")
@@ -447,7 +664,6 @@ class YouTubeDownloaderApp:
         # Initialize batch tracking
         self.total_urls = len(urls)
         self.completed_urls = 0
-        self.current_url_index = 0
         
         # Disable download button during download
         self.download_button.config(state='disabled')
@@ -455,70 +671,55 @@ class YouTubeDownloaderApp:
         self.progress_label.config(text="Starting batch download...")
         self.status_text.delete(1.0, 'end')
         
-        self.log_message(f"🚀 Starting batch download of {self.total_urls} URL(s)")
+        self.engine = self.create_engine(self.get_download_options())
+        jobs = self.engine.build_jobs(urls, video=self.video_var.get(), audio=self.audio_var.get())
         
         # Start download in separate thread
-        download_thread = threading.Thread(target=self.batch_download, args=(urls,))
+        download_thread = threading.Thread(target=self.batch_download, args=(jobs,))
         download_thread.daemon = True
         download_thread.start()
 
-    def batch_download(self, urls):
-        """Download multiple URLs in batch"""
+    def batch_download(self, jobs, resume_batch_id=None):
+        """Download a batch of jobs with the download engine on a worker thread"""
         try:
-            total_success_count = 0
-            failed_urls = []
-            
-            for i, url in enumerate(urls):
-                self.current_url_index = i + 1
-                self.log_message(f"\n📥 Processing URL {self.current_url_index}/{self.total_urls}: {url}")
-                
-                url_success_count = 0
-                
-                # Download video
-                if self.video_var.get():
-                    if self.download_with_yt_dlp(url, 'video'):
-                        url_success_count += 1
-                
-                # Download audio
-                if self.audio_var.get():
-                    if self.download_with_yt_dlp(url, 'audio'):
-                        url_success_count += 1
-                
-                if url_success_count > 0:
-                    total_success_count += url_success_count
-                    self.completed_urls += 1
-                    self.log_message(f"✅ URL {self.current_url_index} completed successfully")
-                else:
-                    failed_urls.append(url)
-                    self.log_message(f"❌ URL {self.current_url_index} failed")
-                
-                # Update overall progress
-                overall_progress = (self.completed_urls / self.total_urls) * 100
-                self.progress_var.set(overall_progress)
-            
-            # Show completion message
-            if total_success_count > 0:
-                self.progress_label.config(text="Batch download completed!")
-                self.log_message(f"\n🎉 Batch download completed!")
-                self.log_message(f"✅ Successfully downloaded {total_success_count} file(s) from {self.completed_urls} URL(s)")
-                
-                if failed_urls:
-                    self.log_message(f"❌ Failed URLs: {len(failed_urls)}")
-                    for failed_url in failed_urls:
-                        self.log_message(f"   - {failed_url}")
-                
-                messagebox.showinfo("Success", f"Batch download completed!\n{total_success_count} file(s) downloaded from {self.completed_urls} URL(s)")
+            if resume_batch_id:
+                self.engine.resume_batch(resume_batch_id)
             else:
-                self.progress_label.config(text="Batch download failed!")
-                self.log_message(f"\n❌ Batch download failed! No files were downloaded.")
-                messagebox.showerror("Error", "Failed to download any files. Check the log for details.")
-                
+                self.engine.run_batch(jobs)
+            if self.profiler is not None:
+                self.profiler.dump(self.profile_path)
         except Exception as e:
-            self.log_message(f"❌ Unexpected error during batch download: {str(e)}")
-            messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-        finally:
-            # Re-enable download button
-            self.download_button.config(state='normal')
+            self.post_event({'type': 'batch_error', 'error': str(e)})
+
+    def show_batch_result(self, result):
+        """Report a finished batch"""
+        total_success_count = result.success_count
+        self.completed_urls = result.completed_urls
+        
+        # Re-enable download button
+        self.download_button.config(state='normal')
+        
+        # Show completion message
+        if total_success_count > 0:
+            self.progress_var.set(100)
+            self.progress_label.config(text="Batch download completed!")
+            self.log_message(f"\n🎉 Batch download completed!")
+            self.log_message(f"✅ Successfully downloaded {total_success_count} file(s) from {self.completed_urls} URL(s)")
+            if result.skipped_count:
+                self.log_message(f"⏭️ {result.skipped_count} file(s) were already downloaded and skipped")
+            
+            if result.failed_urls:
+                self.log_message(f"❌ Failed URLs: {len(result.failed_urls)}")
+                for failed_url in result.failed_urls:
+                    self.log_message(f"   - {failed_url}")
+            
+            self.flush_events()
+            messagebox.showinfo("Success", f"Batch download completed!\n{total_success_count} file(s) downloaded from {self.completed_urls} URL(s)")
+        else:
+            self.progress_label.config(text="Batch download failed!")
+            self.log_message(f"\n❌ Batch download failed! No files were downloaded.")
+            self.flush_events()
+            messagebox.showerror("Error", "Failed to download any files. Check the log for details.")
 
 def main():
     root = tk.Tk()